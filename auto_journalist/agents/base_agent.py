@@ -1,13 +1,53 @@
 import os
+import re
+import time
 import asyncio
 import logging
 import openai
 import aiohttp
-from aiohttp import TCPConnector, ClientSession
+from aiohttp import TCPConnector, ClientSession, TraceConfig
+
+from ..config import LLM_CACHE_ENABLED
+from ..db import end_stage
+from ..llm_cache import cache_key, llm_cache
+from ..metrics import metrics
 
 # We will lazily initialize the aiohttp session when first making an OpenAI call
 _oai_session = None
 
+# Most recent rate-limit state reported by OpenAI response headers
+_rate_limits = {}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_reset(value):
+    """Convert an OpenAI reset header such as ``"6m0s"`` or ``"20ms"`` to seconds."""
+    if not value:
+        return 0.0
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in _DURATION_PART.findall(value))
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+async def _record_rate_limits(session, ctx, params):
+    headers = params.response.headers
+    if "x-ratelimit-remaining-requests" not in headers:
+        return
+    _rate_limits.update(
+        remaining_requests=_parse_int(headers.get("x-ratelimit-remaining-requests")),
+        remaining_tokens=_parse_int(headers.get("x-ratelimit-remaining-tokens")),
+        reset_requests=_parse_reset(headers.get("x-ratelimit-reset-requests")),
+        reset_tokens=_parse_reset(headers.get("x-ratelimit-reset-tokens")),
+        observed_at=time.monotonic(),
+    )
+
 class BaseAgent:
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -18,22 +58,104 @@ class BaseAgent:
         if _oai_session is None:
             # Create TCPConnector on the running loop to force IPv4
             connector = TCPConnector(ssl=True, family=0)
-            _oai_session = ClientSession(connector=connector)
+            # Capture rate-limit headers, which the openai client discards
+            trace_config = TraceConfig()
+            trace_config.on_request_end.append(_record_rate_limits)
+            _oai_session = ClientSession(
+                connector=connector, trace_configs=[trace_config]
+            )
             openai.aiosession.set(_oai_session)
 
-    async def call_openai(self, **kwargs):
+    async def run_stage(self, name, run):
+        """
+        Await ``run()`` and record how long it took as stage ``name``. Inside
+        ``run_session()`` the shared session is then reset (see
+        ``end_stage``) before the next stage starts.
+        """
+        with metrics.timer("stage_seconds", stage=name):
+            try:
+                result = await run()
+            except BaseException:
+                await end_stage(failed=True)
+                raise
+            await end_stage()
+            return result
+
+    def count_processed(self, n=1):
+        """Record ``n`` items finished by this agent."""
+        metrics.inc("items_processed_total", n, agent=self.__class__.__name__)
+
+    async def wait_for_openai_quota(self, requests=1, tokens=0):
+        """
+        Pace OpenAI calls to the quota left in the current rate-limit window.
+
+        ``requests`` and ``tokens`` are what the caller's in-flight workers
+        need per round of calls. Each call waits its share of the time left
+        in the window, scaled by how much of the remaining quota that need
+        takes, so the workers slow down gradually as the quota runs low
+        instead of all stopping at once when it is exhausted; with less than
+        one round left they wait for the window to reset.
+        """
+        if not _rate_limits:
+            return
+        elapsed = time.monotonic() - _rate_limits["observed_at"]
+        delay = 0.0
+        for need, remaining, reset in (
+            (requests, _rate_limits["remaining_requests"], _rate_limits["reset_requests"]),
+            (tokens, _rate_limits["remaining_tokens"], _rate_limits["reset_tokens"]),
+        ):
+            window = reset - elapsed
+            if not need or remaining is None or window <= 0:
+                continue
+            delay = max(delay, window * min(1.0, need / max(remaining, 1)))
+        if delay > 0:
+            metrics.observe("openai_quota_wait_seconds", delay)
+            if delay >= 1:
+                self.logger.info(f"OpenAI quota running low; pausing {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def call_openai(self, use_cache=True, **kwargs):
         """
         Wrap openai.ChatCompletion.acreate with retries and exponential back-off.
         Returns the response object on success, or None if all retries fail.
+
+        Identical requests are answered from the shared LLM cache unless
+        ``use_cache`` is False or the cache is disabled.
         """
+        agent = self.__class__.__name__
+        key = None
+        if use_cache and LLM_CACHE_ENABLED:
+            key = cache_key(kwargs)
+            cached = await llm_cache.get(key, agent)
+            if cached is not None:
+                metrics.inc("openai_cache_hits_total", agent=agent)
+                return openai.util.convert_to_openai_object(cached)
+
+        response = await self._call_openai_with_retries(**kwargs)
+        if response is not None and key is not None:
+            await llm_cache.put(
+                key, agent, kwargs.get("model"), response.to_dict_recursive()
+            )
+        return response
+
+    async def _call_openai_with_retries(self, **kwargs):
         await self._ensure_openai_session()
 
+        agent = self.__class__.__name__
         max_retries = 3
         backoff = 1  # seconds
 
         for attempt in range(1, max_retries + 1):
             try:
-                return await openai.ChatCompletion.acreate(**kwargs)
+                with metrics.timer("openai_request_seconds", agent=agent):
+                    response = await openai.ChatCompletion.acreate(**kwargs)
+                usage = response.get("usage") or {}
+                metrics.inc("openai_requests_total", agent=agent)
+                metrics.inc("openai_tokens_total", usage.get("prompt_tokens", 0),
+                            agent=agent, direction="in")
+                metrics.inc("openai_tokens_total", usage.get("completion_tokens", 0),
+                            agent=agent, direction="out")
+                return response
             except (openai.error.APIConnectionError,
                     openai.error.RateLimitError,
                     asyncio.TimeoutError,
@@ -43,10 +165,12 @@ class BaseAgent:
                         f"OpenAI call failed (attempt {attempt}/{max_retries}): {e!r}. "
                         f"Retrying in {backoff}s..."
                     )
+                    metrics.inc("openai_retries_total", agent=agent)
                     await asyncio.sleep(backoff)
                     backoff *= 2
                     continue
                 else:
+                    metrics.inc("openai_failures_total", agent=agent)
                     self.logger.error(
                         f"OpenAI call failed after {max_retries} attempts: {e!r}. Skipping."
                     )
@@ -55,6 +179,7 @@ class BaseAgent:
     async def close(self):
         """Close the shared aiohttp session at shutdown."""
         global _oai_session
+        llm_cache.log_stats()
         if _oai_session is not None:
             await _oai_session.close()
             _oai_session = None
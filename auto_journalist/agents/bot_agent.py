@@ -427,7 +427,7 @@ class BotAgent(BaseAgent):
                 chat_id=tg_id, text=f"Source '{url}' removed."
             )
 
-
+    async def list_sources(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         tg_id = str(update.effective_user.id)
         async for session in get_session():
             result = await session.execute(
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+
+from .base_agent import BaseAgent
+from ..config import CLUSTER_SIMILARITY, CLUSTER_WINDOW_HOURS
+from ..db import get_session
+from ..minhash import LSHIndex, MinHasher
+from ..models import Article, StoryCluster, Summary
+from ..payload import entry_text
+
+
+class ClusterAgent(BaseAgent):
+    """
+    Group near-duplicate articles so each story is summarized once.
+
+    New (unsummarized, unclustered) articles are compared with MinHash/LSH
+    against every article fetched within the clustering window. A match
+    joins the matched article's cluster, creating it on demand with the
+    matched article as representative. Only representatives and unclustered
+    articles are picked up by the SummarizerAgent.
+
+    ``sources`` (source names) limits clustering to articles from those
+    sources, for pipelines such as the crypto one that only summarize and
+    analyze their own feeds.
+    """
+
+    def __init__(self, similarity=CLUSTER_SIMILARITY, window_hours=CLUSTER_WINDOW_HOURS,
+                 num_perm=64, bands=16, sources=None):
+        super().__init__()
+        self.sources = list(sources) if sources is not None else None
+        self.similarity = similarity
+        self.window = timedelta(hours=window_hours)
+        self.hasher = MinHasher(num_perm)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.index = None
+        self.articles = {}
+
+    async def load_window(self, session):
+        """
+        Index every article in the clustering window that is already
+        summarized or clustered. Returns the remaining new articles as
+        ``(article, signature)`` pairs.
+        """
+        stmt = (
+            sa.select(Article, Summary.id)
+            .outerjoin(Summary, Summary.article_id == Article.id)
+            .where(Article.fetched_at >= datetime.utcnow() - self.window)
+            .order_by(Article.fetched_at, Article.id)
+        )
+        if self.sources is not None:
+            stmt = stmt.where(Article.source.in_(self.sources))
+        rows = (await session.execute(stmt)).all()
+
+        self.index = LSHIndex(self.num_perm, self.bands)
+        self.articles = {}
+        new_articles = []
+        for article, summary_id in rows:
+            sig = self.hasher.signature(entry_text(article.raw_json))
+            if sig is None:
+                continue
+            if summary_id is None and article.cluster_id is None:
+                new_articles.append((article, sig))
+            else:
+                self.articles[article.id] = article
+                self.index.add(article.id, sig)
+        return new_articles
+
+    async def assign(self, session, new_articles):
+        """
+        Cluster ``(article, signature)`` pairs against the loaded window and
+        commit. Returns the ids of the articles that still need a summary.
+        """
+        to_summarize = []
+        for article, sig in new_articles:
+            match_id, score = self.index.best_match(sig, self.similarity)
+            if match_id is None:
+                # Not a duplicate; later articles may still match it
+                self.articles[article.id] = article
+                self.index.add(article.id, sig)
+                to_summarize.append(article.id)
+                continue
+            anchor = self.articles[match_id]
+            if anchor.cluster_id is None:
+                cluster = StoryCluster(representative_article_id=anchor.id)
+                session.add(cluster)
+                await session.flush()
+                anchor.cluster_id = cluster.id
+                await session.execute(
+                    sa.update(Summary)
+                    .where(Summary.article_id == anchor.id)
+                    .values(cluster_id=cluster.id)
+                )
+            article.cluster_id = anchor.cluster_id
+            self.logger.debug(
+                f"Article {article.id} joins cluster {anchor.cluster_id} "
+                f"(similarity {score:.2f})"
+            )
+        await session.commit()
+        return to_summarize
+
+    async def cluster_articles(self, session, article_ids):
+        """
+        Incrementally cluster freshly crawled articles against the window
+        loaded by ``load_window``. Returns the ids that need a summary.
+        """
+        result = await session.execute(
+            sa.select(Article).where(Article.id.in_(article_ids)).order_by(Article.id)
+        )
+        new_articles = []
+        to_summarize = []
+        for article in result.scalars().all():
+            sig = self.hasher.signature(entry_text(article.raw_json))
+            if sig is None:
+                to_summarize.append(article.id)
+            else:
+                new_articles.append((article, sig))
+        return to_summarize + await self.assign(session, new_articles)
+
+    async def run(self):
+        async for session in get_session():
+            new_articles = await self.load_window(session)
+            to_summarize = await self.assign(session, new_articles)
+            # Link summaries written while their article was being clustered
+            await session.execute(
+                sa.update(Summary)
+                .where(
+                    Summary.article_id == Article.id,
+                    Summary.cluster_id.is_(None),
+                    Article.cluster_id.is_not(None),
+                )
+                .values(cluster_id=Article.cluster_id)
+            )
+            await session.commit()
+            self.logger.info(
+                f"Clustered {len(new_articles) - len(to_summarize)} of "
+                f"{len(new_articles)} new articles into existing stories"
+            )
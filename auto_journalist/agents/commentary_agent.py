@@ -1,13 +1,17 @@
 import sqlalchemy as sa
 from sqlalchemy import select
+from ..config import WORK_QUEUE_BATCH, WORK_QUEUE_ENABLED
 from ..db import get_session
+from ..jobqueue import JobQueue
 from ..models import Summary, FactCheck, Commentary
+from ..payload import summary_payload
 from .base_agent import BaseAgent
 
 class CommentaryAgent(BaseAgent):
-    def __init__(self, model_name="gpt-4o"):
+    def __init__(self, model_name="gpt-4o", use_queue=WORK_QUEUE_ENABLED):
         super().__init__()
         self.model = model_name
+        self.use_queue = use_queue
 
     async def generate_commentary(self, summary_text, fact_status, summary_id):
         prompt = [
@@ -17,7 +21,7 @@ class CommentaryAgent(BaseAgent):
                 "content": (
                     "Provide a single-paragraph contextual analysis in a neutral yet engaging tone. "
                     "Mention historical parallels, market impact, or societal angles as relevant.\n\n"
-                    f"Summary: {summary_text}\nFact-check status: {fact_status.value}"
+                    f"Summary:\n{summary_text}\nFact-check status: {fact_status.value}"
                 ),
             },
         ]
@@ -29,22 +33,65 @@ class CommentaryAgent(BaseAgent):
         if response is None:
             self.logger.error(f"Skipping commentary for summary_id={summary_id} due to OpenAI failure.")
             return None
+        self.count_processed()
         return response.choices[0].message.content
 
-    async def run(self):
+    def pending_summaries(self):
+        return (
+            select(Summary, FactCheck)
+            .join(FactCheck, FactCheck.summary_id == Summary.id)
+            .outerjoin(Commentary, Commentary.summary_id == Summary.id)
+            .where(Commentary.id.is_(None))
+        )
+
+    async def process(self, summary_id):
+        """
+        Write and store commentary for one fact-checked summary. Returns the
+        summary id in a list (empty if skipped), for use as a pipeline stage.
+        """
         async for session in get_session():
-            stmt = (
-                select(Summary, FactCheck)
+            result = await session.execute(
+                select(Summary, FactCheck.status)
                 .join(FactCheck, FactCheck.summary_id == Summary.id)
-                .outerjoin(Commentary, Commentary.summary_id == Summary.id)
-                .where(Commentary.id.is_(None))
+                .where(Summary.id == summary_id)
             )
-            result = await session.execute(stmt)
+            row = result.one_or_none()
+        if row is None:
+            return []
+        summary, fact_status = row
+        commentary_text = await self.generate_commentary(
+            summary_payload(summary), fact_status, summary_id
+        )
+        if commentary_text is None:
+            return []
+        async for session in get_session():
+            session.add(Commentary(
+                summary_id=summary_id,
+                commentary_text=commentary_text
+            ))
+            await session.commit()
+        return [summary_id]
+
+    async def run_queued(self, forever=False):
+        """Write commentary through the shared job queue, alongside other workers."""
+        await JobQueue("commentary").work(
+            self.process,
+            self.pending_summaries().with_only_columns(Summary.id),
+            batch=WORK_QUEUE_BATCH,
+            forever=forever,
+        )
+
+    async def run(self):
+        if self.use_queue:
+            await self.run_queued()
+            return
+        async for session in get_session():
+            result = await session.execute(self.pending_summaries())
             rows = result.all()
 
             for summary, factcheck in rows:
                 commentary_text = await self.generate_commentary(
-                    summary.summary_text, factcheck.status, summary.id
+                    summary_payload(summary), factcheck.status, summary.id
                 )
                 if commentary_text is None:
                     continue
@@ -54,4 +101,4 @@ class CommentaryAgent(BaseAgent):
                 )
                 session.add(commentary)
 
-            await session.commit()
\ No newline at end of file
+            await session.commit()
@@ -1,64 +1,399 @@
+import asyncio
+import contextlib
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import aiohttp
 import feedparser
 from datetime import datetime
 import sqlalchemy as sa
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import selectinload
 
 from .base_agent import BaseAgent
+from ..bloom import BloomFilter
 from ..db import get_session
-from ..models import Article, User, PlanEnum
+from ..metrics import metrics
+from ..models import Article, FeedCache, User, UserSource, PlanEnum
+from ..config import (
+    CRAWL_CONCURRENCY,
+    CRAWL_PER_HOST_LIMIT,
+    CRAWL_TIMEOUT,
+    CRAWL_PARSE_PROCESSES,
+    SEEN_URL_FILTER_PATH,
+    SEEN_URL_FILTER_ERROR_RATE,
+    SEEN_URL_FILTER_MAX_BYTES,
+    SEEN_URL_FILTER_VERIFY,
+)
+
+USER_AGENT = "Auto-Journalist/0.1"
+
+# Headroom left in a rebuilt seen-URL filter before it has to be rebuilt again
+SEEN_URL_FILTER_GROWTH = 2
+SEEN_URL_FILTER_MIN_CAPACITY = 100_000
+
 
 class CrawlerAgent(BaseAgent):
-    def __init__(self, sources=None):
+    def __init__(
+        self,
+        sources=None,
+        concurrency=CRAWL_CONCURRENCY,
+        per_host_limit=CRAWL_PER_HOST_LIMIT,
+        timeout=CRAWL_TIMEOUT,
+        parse_processes=CRAWL_PARSE_PROCESSES,
+        seen_filter_path=SEEN_URL_FILTER_PATH,
+    ):
         super().__init__()
         self.sources_override = sources
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.parse_processes = parse_processes
+        self._parse_executor = None
+        self.seen_filter_path = seen_filter_path
+        self.seen_filter = None
+        self.filter_stats = {"negatives": 0, "positives": 0, "false_positives": 0}
+        # Conditional GET counters, accumulated over the agent's lifetime so
+        # repeated runs (e.g. run_stream loops) can report total savings.
+        self.cache_stats = {"hits": 0, "misses": 0, "bytes_saved": 0}
+
+    def _get_parse_executor(self):
+        # None selects the loop's default thread pool
+        if self.parse_processes > 0 and self._parse_executor is None:
+            self._parse_executor = ProcessPoolExecutor(max_workers=self.parse_processes)
+        return self._parse_executor
+
+    def close_parse_executor(self):
+        """Stop the feed-parsing worker processes, if any were started."""
+        if self._parse_executor is not None:
+            self._parse_executor.shutdown(wait=False, cancel_futures=True)
+            self._parse_executor = None
+
+    async def close(self):
+        self.close_parse_executor()
+        await super().close()
+
+    def _open_http_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.per_host_limit
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": USER_AGENT},
+        )
+
+    async def parse_feed(self, body, content_type=None):
+        """Parse a downloaded feed document without blocking the event loop."""
+        headers = {"content-type": content_type} if content_type else {}
+        parse = functools.partial(feedparser.parse, body, response_headers=headers)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_parse_executor(), parse)
+
+    async def fetch_feed(self, http, url, cached=None):
+        """
+        Download and parse a single feed. When ``cached`` (the validators
+        stored for the feed) is given, its validators are sent as a conditional GET.
+
+        Returns ``(feed, validators)``. ``feed`` is None if the download failed
+        or the server answered 304 Not Modified; ``validators`` is a dict of
+        fresh cache values, or None when nothing new was downloaded.
+        """
+        headers = {}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            with metrics.timer("feed_fetch_seconds"):
+                async with http.get(url, headers=headers) as resp:
+                    if resp.status == 304 and not headers:
+                        # A 304 to an unconditional GET (e.g. from a proxy)
+                        # has nothing cached to fall back on: count a miss
+                        self.cache_stats["misses"] += 1
+                        self.logger.warning(f"Unexpected 304 for unconditional GET of {url}")
+                        return None, None
+                    if resp.status == 304:
+                        self.cache_stats["hits"] += 1
+                        self.cache_stats["bytes_saved"] += cached["content_length"]
+                        self.logger.debug(f"Feed not modified: {url}")
+                        return None, None
+                    resp.raise_for_status()
+                    body = await resp.read()
+                    content_type = resp.headers.get("Content-Type")
+                    validators = {
+                        "etag": resp.headers.get("ETag"),
+                        "last_modified": resp.headers.get("Last-Modified"),
+                        "content_length": len(body),
+                    }
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.logger.warning(f"Failed to fetch feed {url}: {e!r}")
+            return None, None
+        self.cache_stats["misses"] += 1
+        return await self.parse_feed(body, content_type), validators
+
+    async def _fetch_source(self, http, src, cached):
+        self.logger.info(f"Fetching feed: {src['url']}")
+        feed, validators = await self.fetch_feed(http, src["url"], cached)
+        return src, feed, validators
+
+    async def load_feed_cache(self, session, urls):
+        result = await session.execute(
+            sa.select(FeedCache).where(FeedCache.url.in_(urls))
+        )
+        # Plain dicts, so later rollbacks in the session cannot expire them
+        return {
+            row.url: {
+                "etag": row.etag,
+                "last_modified": row.last_modified,
+                "content_length": row.content_length,
+            }
+            for row in result.scalars().all()
+        }
+
+    async def store_validators(self, session, url, validators):
+        """Remember a feed's validators for the next conditional GET."""
+        values = dict(validators, checked_at=datetime.utcnow())
+        stmt = (
+            pg_insert(FeedCache)
+            .values(url=url, **values)
+            .on_conflict_do_update(index_elements=["url"], set_=values)
+        )
+        await session.execute(stmt)
+
+    async def gather_sources(self, session):
+        """Return the deduplicated list of feeds to crawl."""
+        sources = []
+        if self.sources_override is not None:
+            active_sources = self.sources_override
+        else:
+            from ..config import get_all_sources
+            active_sources = get_all_sources()
+        for s in active_sources:
+            sources.append({"name": s["name"], "url": s["url"]})
 
-    async def fetch_feed(self, url):
-        return feedparser.parse(url)
+        # Add user‐specific sources for premium users
+        result = await session.execute(
+            sa.select(User)
+            .options(selectinload(User.user_sources).selectinload(UserSource.source))
+            .where(User.plan == PlanEnum.PREMIUM)
+        )
+        for user in result.scalars().all():
+            for user_src in user.user_sources:
+                src = user_src.source
+                sources.append({"name": src.name, "url": src.url})
+
+        # Deduplicate by URL
+        seen = set()
+        final_sources = []
+        for s in sources:
+            if s["url"] not in seen:
+                seen.add(s["url"])
+                final_sources.append(s)
+        return final_sources
+
+    async def rebuild_seen_filter(self, session):
+        """Rebuild the seen-URL filter from every URL in ``articles``."""
+        total = (await session.execute(sa.select(sa.func.count(Article.id)))).scalar_one()
+        bloom = BloomFilter(
+            max(total * SEEN_URL_FILTER_GROWTH, SEEN_URL_FILTER_MIN_CAPACITY),
+            error_rate=SEEN_URL_FILTER_ERROR_RATE,
+            max_bytes=SEEN_URL_FILTER_MAX_BYTES,
+        )
+        urls = await session.stream_scalars(
+            sa.select(Article.url).execution_options(yield_per=10_000)
+        )
+        async for url in urls:
+            bloom.add(url)
+        self.logger.info(
+            f"Rebuilt seen-URL filter: {bloom.count} URLs in {bloom.nbytes} bytes"
+        )
+        self.seen_filter = bloom
+        self.save_seen_filter()
+        return bloom
+
+    async def load_seen_filter(self, session):
+        """Load the seen-URL filter from disk, rebuilding it when missing or full."""
+        if not self.seen_filter_path:
+            return None
+        if self.seen_filter is None:
+            try:
+                self.seen_filter = BloomFilter.load(self.seen_filter_path)
+            except FileNotFoundError:
+                pass
+            except ValueError as e:
+                self.logger.warning(f"Ignoring seen-URL filter: {e}")
+        if self.seen_filter is None or self.seen_filter.saturated:
+            await self.rebuild_seen_filter(session)
+        return self.seen_filter
+
+    def save_seen_filter(self):
+        if self.seen_filter is not None and self.seen_filter_path:
+            self.seen_filter.save(self.seen_filter_path)
+
+    async def _filter_existing(self, session, urls):
+        """Return the subset of ``urls`` already stored in ``articles``."""
+        bloom = self.seen_filter
+        if bloom is None:
+            candidates = urls
+        else:
+            # The filter has no false negatives, so only its positives can
+            # already be stored.
+            candidates = [url for url in urls if url in bloom]
+            self.filter_stats["negatives"] += len(urls) - len(candidates)
+            self.filter_stats["positives"] += len(candidates)
+            if not SEEN_URL_FILTER_VERIFY:
+                return set(candidates)
+        if not candidates:
+            return set()
+        result = await session.execute(
+            sa.select(Article.url).where(Article.url.in_(candidates))
+        )
+        existing = set(result.scalars().all())
+        if bloom is not None:
+            self.filter_stats["false_positives"] += len(candidates) - len(existing)
+        return existing
+
+    async def ingest_feed(self, session, src, feed):
+        """
+        Store a feed's new entries with a single multi-row insert.
+
+        URLs already in ``articles`` are filtered out first, consulting the
+        seen-URL filter before the database; the insert itself uses ON
+        CONFLICT DO NOTHING so concurrent crawlers cannot collide.
+        Returns ``(inserted_ids, skipped)``.
+        """
+        entries = {}
+        for entry in feed.entries:
+            article_url = entry.get("link")
+            if article_url and article_url not in entries:
+                entries[article_url] = entry
+        if not entries:
+            return [], len(feed.entries)
+
+        for article_url in await self._filter_existing(session, list(entries)):
+            del entries[article_url]
+        if not entries:
+            return [], len(feed.entries)
+
+        now = datetime.utcnow()
+        stmt = (
+            pg_insert(Article)
+            .values([
+                {
+                    "url": article_url,
+                    "source": src["name"],
+                    "raw_json": entry,
+                    "fetched_at": now,
+                }
+                for article_url, entry in entries.items()
+            ])
+            .on_conflict_do_nothing(index_elements=["url"])
+            .returning(Article.id)
+        )
+        inserted_ids = (await session.execute(stmt)).scalars().all()
+        return inserted_ids, len(feed.entries) - len(inserted_ids)
+
+    def mark_seen(self, feed):
+        """
+        Add a feed's entry URLs to the seen-URL filter. Call only once the
+        ingest is committed: the filter must not claim URLs a rolled-back
+        transaction never stored.
+        """
+        bloom = self.seen_filter
+        if bloom is not None:
+            # Conflicting URLs are stored too, so every one of them is seen;
+            # URLs the filter already reports would only inflate its count
+            urls = {entry.get("link") for entry in feed.entries} - {None, ""}
+            bloom.update(url for url in urls if url not in bloom)
 
     async def run(self):
+        try:
+            async for _ in self.crawl():
+                pass
+        finally:
+            # A one-off crawl; crawl() callers reuse the pool until close()
+            self.close_parse_executor()
+
+    async def crawl(self, sources=None, http=None, on_feed=None):
+        """
+        Crawl every source, yielding the ids of each feed's newly inserted
+        articles as soon as they are committed.
+
+        ``sources`` restricts the crawl to those feeds and ``http`` reuses an
+        open client session. ``on_feed(url, new_count)`` is called for every
+        feed polled, with 0 when it was unchanged or failed.
+        """
         async for session in get_session():
-            # Gather configured sources
-            sources = []
-            if self.sources_override is not None:
-                active_sources = self.sources_override
-            else:
-                from ..config import get_all_sources
-                active_sources = get_all_sources()
-            for s in active_sources:
-                sources.append({"name": s["name"], "url": s["url"]})
-
-            # Add user‐specific sources for premium users
-            result = await session.execute(sa.select(User))
-            users = result.scalars().all()
-            for user in users:
-                if user.plan == PlanEnum.PREMIUM:
-                    for src in user.sources:
-                        sources.append({"name": src.name, "url": src.url})
-
-            # Deduplicate by URL
-            seen = set()
-            final_sources = []
-            for s in sources:
-                if s["url"] not in seen:
-                    seen.add(s["url"])
-                    final_sources.append(s)
-
-            # Fetch each feed
-            for src in final_sources:
-                feed_url = src["url"]
-                self.logger.info(f"Fetching feed: {feed_url}")
-                feed = await self.fetch_feed(feed_url)
-                for entry in feed.entries:
-                    article_url = entry.link
-                    try:
-                        article = Article(
-                            url=article_url,
-                            source=src["name"],
-                            raw_json=entry,
-                            fetched_at=datetime.utcnow()
-                        )
-                        session.add(article)
-                        await session.commit()
-                    except IntegrityError:
-                        await session.rollback()
-                        self.logger.debug(f"Duplicate skipped: {article_url}")
+            final_sources = sources if sources is not None else await self.gather_sources(session)
+            await self.load_seen_filter(session)
+            feed_cache = await self.load_feed_cache(
+                session, [src["url"] for src in final_sources]
+            )
+            hits_before = self.cache_stats["hits"]
+            inserted = skipped = 0
+
+            # Download every feed concurrently and ingest them as they arrive,
+            # so a crawl takes about as long as the slowest feed.
+            async with contextlib.AsyncExitStack() as stack:
+                if http is None:
+                    http = await stack.enter_async_context(self._open_http_session())
+                tasks = [
+                    asyncio.create_task(
+                        self._fetch_source(http, src, feed_cache.get(src["url"]))
+                    )
+                    for src in final_sources
+                ]
+                try:
+                    for next_feed in asyncio.as_completed(tasks):
+                        src, feed, validators = await next_feed
+                        if feed is None:
+                            if on_feed is not None:
+                                on_feed(src["url"], 0)
+                            continue
+                        try:
+                            new_ids, feed_skipped = await self.ingest_feed(session, src, feed)
+                            # Validators are committed together with the entries, so
+                            # a failed ingest is retried on the next run.
+                            await self.store_validators(session, src["url"], validators)
+                            await session.commit()
+                        except Exception:
+                            # One bad feed must not abort the rest of the crawl
+                            self.logger.exception(f"Failed to ingest {src['url']}")
+                            await session.rollback()
+                            if on_feed is not None:
+                                on_feed(src["url"], 0)
+                            continue
+                        self.mark_seen(feed)
+                        self.count_processed(len(new_ids))
+                        inserted += len(new_ids)
+                        skipped += feed_skipped
+                        if on_feed is not None:
+                            on_feed(src["url"], len(new_ids))
+                        if new_ids:
+                            yield new_ids
+                finally:
+                    # Stopped early (an error, or the consumer closed us):
+                    # don't leave downloads running on the closing session
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+
+            if inserted:
+                self.save_seen_filter()
+            self.logger.info(
+                f"Ingested {inserted} new articles, skipped {skipped} duplicates"
+            )
+            if self.seen_filter is not None:
+                self.logger.info(
+                    f"Seen-URL filter: negatives={self.filter_stats['negatives']} "
+                    f"positives={self.filter_stats['positives']} "
+                    f"false_positives={self.filter_stats['false_positives']}"
+                )
+            self.logger.info(
+                f"Feed cache: {self.cache_stats['hits'] - hits_before}/{len(final_sources)} "
+                f"not modified this run; totals hits={self.cache_stats['hits']} "
+                f"misses={self.cache_stats['misses']} "
+                f"bytes_saved={self.cache_stats['bytes_saved']}"
+            )
@@ -19,15 +19,20 @@ class CryptoTrendAgent(BaseAgent):
         token = os.getenv("TELEGRAM_TOKEN")
         self.bot = Bot(token=token) if token and CRYPTO_TELEGRAM_CHAT_ID else None
 
+    @staticmethod
+    def recent_summaries(source_names, limit: int = 10):
+        """Latest summary texts from the given crypto sources."""
+        return (
+            sa.select(Summary.summary_text)
+            .join(Article, Article.id == Summary.article_id)
+            .where(Article.source.in_(source_names))
+            .order_by(Summary.created_at.desc())
+            .limit(limit)
+        )
+
     async def run(self) -> None:
         async for session in get_session():
-            stmt = (
-                sa.select(Summary.summary_text)
-                .join(Article, Article.id == Summary.article_id)
-                .where(Article.source.in_(self.source_names))
-                .order_by(Summary.created_at.desc())
-                .limit(10)
-            )
+            stmt = self.recent_summaries(self.source_names)
             rows = (await session.execute(stmt)).scalars().all()
             if not rows:
                 return
@@ -1,4 +1,5 @@
 from .crawler_agent import CrawlerAgent
+from .cluster_agent import ClusterAgent
 from .summarizer_agent import SummarizerAgent
 from .crypto_agent import CryptoTrendAgent
 from .base_agent import BaseAgent
@@ -11,12 +12,21 @@ class CryptoOrchestrator(BaseAgent):
     def __init__(self) -> None:
         super().__init__()
         self.crawler = CrawlerAgent(sources=CRYPTO_SOURCES)
+        # Matching crypto articles against general news would hide them from
+        # the summarizer and CryptoTrendAgent as non-representative members
+        self.clusterer = ClusterAgent(sources=[src["name"] for src in CRYPTO_SOURCES])
         self.summarizer = SummarizerAgent()
         self.crypto_agent = CryptoTrendAgent()
 
+    async def close(self) -> None:
+        # The crawler's parse processes would otherwise outlive the run
+        self.crawler.close_parse_executor()
+        await super().close()
+
     async def run_once(self) -> None:
-        await self.crawler.run()
-        await self.summarizer.run()
-        await self.crypto_agent.run()
+        await self.run_stage("crawl", self.crawler.run)
+        await self.run_stage("cluster", self.clusterer.run)
+        await self.run_stage("summarize", self.summarizer.run)
+        await self.run_stage("crypto", self.crypto_agent.run)
         await self.close()
 
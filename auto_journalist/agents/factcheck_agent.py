@@ -1,12 +1,24 @@
+import json
 from sqlalchemy import select
+from ..config import FACTCHECK_BATCH_SIZE, FACTCHECK_BATCH_TOKENS, WORK_QUEUE_ENABLED
 from ..db import get_session
+from ..jobqueue import JobQueue
 from ..models import Summary, FactCheck, FactStatusEnum
+from ..payload import count_tokens, strip_code_fence, summary_payload
 from .base_agent import BaseAgent
 
+# Completion budget per summary in batched requests
+BATCH_TOKENS_PER_ITEM = 150
+
+
 class FactCheckAgent(BaseAgent):
-    def __init__(self, model_name="gpt-4o"):
+    def __init__(self, model_name="gpt-4o", batch_size=FACTCHECK_BATCH_SIZE,
+                 batch_tokens=FACTCHECK_BATCH_TOKENS, use_queue=WORK_QUEUE_ENABLED):
         super().__init__()
         self.model = model_name
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.use_queue = use_queue
 
     async def fact_check(self, summary_text, summary_id=None):
         prompt = [
@@ -36,13 +48,13 @@ class FactCheckAgent(BaseAgent):
             return FactStatusEnum.NOT_VERIFIABLE, [], ""
 
         try:
-            import json
-            payload = response.choices[0].message.content.strip()
+            payload = strip_code_fence(response.choices[0].message.content)
             data = json.loads(payload)
             status_str = data.get("status", "not_verifiable")
             citations = data.get("citations", [])
             analysis = data.get("analysis", "")
             status = FactStatusEnum(status_str)
+            self.count_processed()
             return status, citations, analysis
         except Exception as e:
             self.logger.error(
@@ -54,18 +66,160 @@ class FactCheckAgent(BaseAgent):
         """Fact-check arbitrary user provided text or article."""
         return await self.fact_check(text, None)
 
-    async def run(self):
+    def _parse_batch(self, content, expected_ids):
+        """Map summary_id -> (status, citations); raise ValueError if incomplete."""
+        data = json.loads(strip_code_fence(content))
+        if not isinstance(data, list):
+            raise ValueError("expected a JSON array")
+        results = {}
+        for item in data:
+            summary_id = int(item["summary_id"])
+            if summary_id in expected_ids:
+                status = FactStatusEnum(item.get("status", "not_verifiable"))
+                results[summary_id] = (status, item.get("citations") or [])
+        missing = expected_ids - results.keys()
+        if missing:
+            raise ValueError(f"missing results for summary_ids {sorted(missing)}")
+        return results
+
+    async def fact_check_batch(self, items):
+        """
+        Fact-check several ``(summary_id, summary_text)`` pairs in one request.
+
+        Returns a dict of summary_id -> (status, citations). If the answer
+        cannot be parsed, the batch is split in half and each half retried;
+        single items fall back to ``fact_check``.
+        """
+        if len(items) == 1:
+            summary_id, text = items[0]
+            status, citations, _ = await self.fact_check(text, summary_id)
+            return {summary_id: (status, citations)}
+
+        listing = "\n\n".join(
+            f"[summary_id={summary_id}]\n{text}" for summary_id, text in items
+        )
+        prompt = [
+            {"role": "system", "content": "You are a fact-checking engine."},
+            {
+                "role": "user",
+                "content": (
+                    "Check each of the following texts against reputable sources such as Wikipedia. "
+                    "Respond with only a JSON array containing one object per text:\n"
+                    "[{\"summary_id\": <id>, \"status\": \"verified\" | \"disputed\" | \"not_verifiable\", \"citations\": [...]}]\n\n"
+                    f"{listing}"
+                ),
+            },
+        ]
+        response = await self.call_openai(
+            model=self.model,
+            messages=prompt,
+            max_tokens=BATCH_TOKENS_PER_ITEM * len(items)
+        )
+        if response is None:
+            self.logger.error(
+                f"Marking {len(items)} fact checks as NOT_VERIFIABLE due to OpenAI failure."
+            )
+            return {
+                summary_id: (FactStatusEnum.NOT_VERIFIABLE, [])
+                for summary_id, _ in items
+            }
+        try:
+            results = self._parse_batch(
+                response.choices[0].message.content,
+                {summary_id for summary_id, _ in items},
+            )
+            self.count_processed(len(results))
+            return results
+        except (ValueError, KeyError, TypeError) as e:
+            self.logger.warning(
+                f"Splitting fact-check batch of {len(items)} after bad response: {e!r}"
+            )
+        middle = len(items) // 2
+        results = await self.fact_check_batch(items[:middle])
+        results.update(await self.fact_check_batch(items[middle:]))
+        return results
+
+    def make_batches(self, summaries):
+        """Group summaries into batches bounded by count and input tokens."""
+        batch, batch_tokens = [], 0
+        for summary in summaries:
+            text = summary_payload(summary)
+            tokens = count_tokens(text, self.model)
+            if batch and (
+                len(batch) >= self.batch_size
+                or batch_tokens + tokens > self.batch_tokens
+            ):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append((summary.id, text))
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def pending_summaries(self):
+        return (
+            select(Summary)
+            .outerjoin(FactCheck, FactCheck.summary_id == Summary.id)
+            .where(FactCheck.id.is_(None))
+        )
+
+    async def process_batch(self, summary_ids):
+        """
+        Fact-check and store a batch of summaries by id. Returns the ids that
+        were checked, for use as a pipeline stage.
+        """
         async for session in get_session():
-            stmt = (
-                select(Summary)
-                .outerjoin(FactCheck, FactCheck.summary_id == Summary.id)
-                .where(FactCheck.id.is_(None))
+            result = await session.execute(
+                select(Summary).where(Summary.id.in_(summary_ids))
             )
-            result = await session.execute(stmt)
+            summaries = result.scalars().all()
+        results = {}
+        for batch in self.make_batches(summaries):
+            results.update(await self.fact_check_batch(batch))
+        if not results:
+            return []
+        async for session in get_session():
+            for summary_id, (status, citations) in results.items():
+                session.add(FactCheck(
+                    summary_id=summary_id,
+                    status=status,
+                    citations=citations
+                ))
+            await session.commit()
+        return list(results)
+
+    async def run_queued(self, forever=False):
+        """Fact-check through the shared job queue, alongside other workers."""
+        await JobQueue("factcheck").work(
+            self.process_batch,
+            self.pending_summaries().with_only_columns(Summary.id),
+            batch=max(self.batch_size, 1),
+            batched=True,
+            forever=forever,
+        )
+
+    async def run(self):
+        if self.use_queue:
+            await self.run_queued()
+            return
+        async for session in get_session():
+            result = await session.execute(self.pending_summaries())
             summaries = result.scalars().all()
 
+            if self.batch_size > 1:
+                for batch in self.make_batches(summaries):
+                    results = await self.fact_check_batch(batch)
+                    for summary_id, (status, citations) in results.items():
+                        session.add(FactCheck(
+                            summary_id=summary_id,
+                            status=status,
+                            citations=citations
+                        ))
+                    await session.commit()
+                return
+
             for summary in summaries:
-                status, citations, _ = await self.fact_check(summary.summary_text, summary.id)
+                status, citations, _ = await self.fact_check(summary_payload(summary), summary.id)
                 fact = FactCheck(
                     summary_id=summary.id,
                     status=status,
@@ -74,4 +228,3 @@ class FactCheckAgent(BaseAgent):
                 session.add(fact)
 
             await session.commit()
-
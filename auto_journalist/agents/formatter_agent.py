@@ -1,74 +1,343 @@
+import contextlib
+import hashlib
 import os
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 import markdown_it
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from ..config import (
+    FORMATTER_BYTECODE_CACHE_DIR,
+    FORMATTER_FRAGMENT_CACHE_DAYS,
+    FORMATTER_FRAGMENT_CACHE_DIR,
+    FORMATTER_FRAGMENT_CACHE_MAX_BYTES,
+    FORMATTER_YIELD_PER,
+)
 from ..db import get_session
-from ..models import Summary, FactCheck, Commentary, Issue
+from ..lru import LRUCache
+from ..metrics import metrics
+from ..models import Summary, FactCheck, Commentary, Issue, IssueItem
 
-class FormatterAgent:
-    def __init__(self):
+# Stands in for the items while a page template is split into head and tail
+_BODY = "\x00body\x00"
+
+ITEM_TEMPLATE = "newsletter_item.md.j2"
+
+# Shared by every FormatterAgent in the process, so templates are compiled
+# once and item fragments are reused across issues and per-user variants
+_env = None
+# content hash -> (markdown, html) bytes of a rendered item
+_fragments = LRUCache(
+    FORMATTER_FRAGMENT_CACHE_MAX_BYTES, sizeof=lambda pair: len(pair[0]) + len(pair[1])
+)
+
+
+def _environment():
+    global _env
+    if _env is None:
         templates_dir = Path(__file__).resolve().parent.parent / "templates"
-        self.env = Environment(
-            loader=FileSystemLoader(searchpath=str(templates_dir))
+        bytecode_cache = None
+        if FORMATTER_BYTECODE_CACHE_DIR:
+            os.makedirs(FORMATTER_BYTECODE_CACHE_DIR, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(FORMATTER_BYTECODE_CACHE_DIR)
+        _env = Environment(
+            loader=FileSystemLoader(searchpath=str(templates_dir)),
+            bytecode_cache=bytecode_cache,
+            enable_async=True,
         )
+    return _env
+
+
+class FragmentStore:
+    """
+    Rendered item fragments on disk, one ``<key>.md`` / ``<key>.html`` pair
+    per content hash under ``directory``, so they outlive the process.
+    Reading a fragment refreshes its mtime; ``prune`` deletes fragments not
+    read or written for ``max_age`` seconds.
+    """
+
+    def __init__(self, directory, max_age=FORMATTER_FRAGMENT_CACHE_DAYS * 86400):
+        self.directory = directory
+        self.max_age = max_age
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, key[:2], f"{key}.{ext}")
+
+    def get(self, key):
+        try:
+            with open(self._path(key, "md"), "rb") as f:
+                markdown = f.read()
+            with open(self._path(key, "html"), "rb") as f:
+                html = f.read()
+        except OSError:
+            return None
+        for ext in ("md", "html"):
+            try:
+                os.utime(self._path(key, ext))
+            except OSError:
+                pass
+        return markdown, html
+
+    def put(self, key, fragment):
+        os.makedirs(os.path.dirname(self._path(key, "md")), exist_ok=True)
+        # The .md file goes last: get() needs both, so a torn pair reads as a miss
+        for ext, data in (("html", fragment[1]), ("md", fragment[0])):
+            path = self._path(key, ext)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+
+    def prune(self):
+        """Delete expired fragments; returns how many files were removed."""
+        if not os.path.isdir(self.directory):
+            return 0
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir():
+                continue
+            for fragment in os.scandir(entry.path):
+                try:
+                    if fragment.stat().st_mtime < cutoff:
+                        os.remove(fragment.path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+
+def _open_before_tail(path, tail):
+    """
+    Open ``path`` for appending just before ``tail``, which is truncated
+    away. Returns None when the file does not end with ``tail``.
+    """
+    if not os.path.exists(path):
+        return None
+    f = open(path, "r+b")
+    size = f.seek(0, os.SEEK_END)
+    if size < len(tail):
+        f.close()
+        return None
+    f.seek(size - len(tail))
+    if f.read() != tail:
+        f.close()
+        return None
+    f.seek(size - len(tail))
+    f.truncate()
+    return f
+
+
+class FormatterAgent:
+    """
+    Render the daily issue as Markdown (txt), HTML and an RSS page.
+
+    Items are streamed from a server-side cursor and written to all three
+    files as they arrive, so memory use does not grow with the size of the
+    issue. Items finished after the issue was created are appended to the
+    existing files on the next run instead of re-rendering the whole day.
+    """
+
+    def __init__(self, yield_per=FORMATTER_YIELD_PER):
+        self.env = _environment()
         self.md = markdown_it.MarkdownIt()
+        self.yield_per = yield_per
+        self.fragments = _fragments
+        self.store = FragmentStore(FORMATTER_FRAGMENT_CACHE_DIR) if FORMATTER_FRAGMENT_CACHE_DIR else None
+        # Cached fragments are only valid for the item template they came from
+        source, _, _ = self.env.loader.get_source(self.env, ITEM_TEMPLATE)
+        self.item_version = hashlib.sha256(source.encode()).hexdigest()
+
+    @staticmethod
+    def _day_range(column, day):
+        # A half-open range instead of date(column) = day keeps the
+        # created_at / date indexes usable
+        start = datetime.combine(day, datetime.min.time())
+        return sa.and_(column >= start, column < start + timedelta(days=1))
+
+    @staticmethod
+    def issue_items(day, issue_id=None):
+        """
+        Fact-checked, commented summaries created on ``day``, in the order
+        their commentary was written, optionally only those not yet in the
+        files of issue ``issue_id``. Commentaries commit out of id order in
+        concurrent runs, so a watermark on their id could skip one for good.
+        """
+        stmt = (
+            sa.select(
+                Summary.id.label("summary_id"),
+                Summary.summary_text,
+                Summary.topic,
+                Summary.author,
+                FactCheck.status.label("fact_status"),
+                Commentary.id.label("commentary_id"),
+                Commentary.commentary_text,
+            )
+            .join(FactCheck, FactCheck.summary_id == Summary.id)
+            .join(Commentary, Commentary.summary_id == Summary.id)
+            .where(FormatterAgent._day_range(Summary.created_at, day))
+            .order_by(Commentary.id)
+        )
+        if issue_id is not None:
+            stmt = stmt.where(
+                ~sa.exists().where(
+                    IssueItem.issue_id == issue_id,
+                    IssueItem.commentary_id == Commentary.id,
+                )
+            )
+        return stmt
+
+    @staticmethod
+    def output_paths(day):
+        fname_base = f"newsletter_{day}"
+        return {
+            "txt": os.path.join("output", f"{fname_base}.txt"),
+            "html": os.path.join("output", f"{fname_base}.html"),
+            "rss": os.path.join("public/rss", f"{day}.html"),
+        }
+
+    async def _frames(self, day):
+        """``{output: (head, tail)}`` as bytes, surrounding the streamed items."""
+        md_page = await self.env.get_template("newsletter.md.j2").render_async(body=_BODY, date=day)
+        md_head, md_tail = md_page.split(_BODY)
+        html_page = await self.env.get_template("newsletter.html.j2").render_async(body=_BODY, date=day)
+        html_head, html_tail = html_page.split(_BODY)
+        html = (
+            (html_head + self.md.render(md_head)).encode(),
+            (self.md.render(md_tail) + html_tail).encode(),
+        )
+        return {"txt": (md_head.encode(), md_tail.encode()), "html": html, "rss": html}
+
+    def _fragment_key(self, item):
+        content = [self.item_version] + [
+            str(item[column]) for column in
+            ("topic", "summary_text", "author", "fact_status", "commentary_text")
+        ]
+        return hashlib.sha256("\x00".join(content).encode()).hexdigest()
+
+    async def render_item(self, template, item):
+        """
+        ``(markdown, html)`` bytes for one issue item. Fragments are cached by
+        a hash of the item's content, so unchanged summaries and commentaries
+        are not rendered again, in this process or (via ``store``) later runs.
+        """
+        key = self._fragment_key(item)
+        fragment = self.fragments.get(key)
+        if fragment is not None:
+            metrics.inc("formatter_fragment_hits_total", tier="memory")
+            return fragment
+        fragment = self.store.get(key) if self.store is not None else None
+        if fragment is not None:
+            metrics.inc("formatter_fragment_hits_total", tier="disk")
+        else:
+            markdown = await template.render_async(item=item)
+            fragment = (markdown.encode(), self.md.render(markdown).encode())
+            metrics.inc("formatter_fragments_rendered_total")
+            if self.store is not None:
+                self.store.put(key, fragment)
+        self.fragments.put(key, fragment)
+        return fragment
+
+    async def _write_items(self, session, stmt, files):
+        """Stream ``stmt`` into ``files``; returns the written commentary ids."""
+        template = self.env.get_template(ITEM_TEMPLATE)
+        result = await session.stream(stmt.execution_options(yield_per=self.yield_per))
+        written = []
+        async for item in result.mappings():
+            markdown, html = await self.render_item(template, item)
+            files["txt"].write(markdown)
+            files["html"].write(html)
+            files["rss"].write(html)
+            written.append(item["commentary_id"])
+        metrics.inc("items_processed_total", len(written), agent=self.__class__.__name__)
+        return written
+
+    async def _render(self, session, day, paths, frames):
+        """Write the whole issue to temporary files, then swap them in."""
+        os.makedirs("output", exist_ok=True)
+        os.makedirs("public/rss", exist_ok=True)
+        files = {}
+        done = False
+        try:
+            for name, path in paths.items():
+                files[name] = open(f"{path}.tmp", "wb")
+                files[name].write(frames[name][0])
+            written = await self._write_items(session, self.issue_items(day), files)
+            for name, f in files.items():
+                f.write(frames[name][1])
+            done = True
+        finally:
+            for f in files.values():
+                f.close()
+            if not done:
+                # Don't leave half-written issues behind
+                for path in paths.values():
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(f"{path}.tmp")
+        for path in paths.values():
+            os.replace(f"{path}.tmp", path)
+        return written
+
+    async def _append(self, session, day, issue_id, paths, frames):
+        """
+        Append the items not yet in issue ``issue_id`` to the existing files.
+        Returns None when the files no longer match the templates' tails.
+        """
+        files = {}
+        try:
+            for name, path in paths.items():
+                f = _open_before_tail(path, frames[name][1])
+                if f is None:
+                    return None
+                files[name] = f
+            written = await self._write_items(session, self.issue_items(day, issue_id), files)
+            for name, f in files.items():
+                f.write(frames[name][1])
+        finally:
+            for f in files.values():
+                f.close()
+        return written
 
     async def run(self):
         async for session in get_session():
             today = datetime.utcnow().date()
-            exists = await session.execute(
-                sa.select(Issue).where(sa.func.date(Issue.date) == today)
-            )
-            if exists.scalar_one_or_none():
-                return
-
-            stmt = (
-                sa.select(Summary, FactCheck, Commentary)
-                .join(FactCheck, FactCheck.summary_id == Summary.id)
-                .join(Commentary, Commentary.summary_id == Summary.id)
-                .where(sa.func.date(Summary.created_at) == today)
-            )
-            rows = (await session.execute(stmt)).all()
-
-            context = []
-            for summary, factcheck, commentary in rows:
-                context.append({
-                    "summary": summary,
-                    "fact": factcheck,
-                    "commentary": commentary,
-                })
-
-            template_md = self.env.get_template("newsletter.md.j2")
-            markdown_content = template_md.render(items=context, date=today)
-
-            template_html = self.env.get_template("newsletter.html.j2")
-            html_content = template_html.render(
-                body=self.md.render(markdown_content),
-                date=today
-            )
+            issue = (await session.execute(
+                sa.select(Issue).where(self._day_range(Issue.date, today))
+            )).scalar_one_or_none()
+            paths = self.output_paths(today)
+            frames = await self._frames(today)
 
-            os.makedirs("output", exist_ok=True)
-            os.makedirs("public/rss", exist_ok=True)
-            fname_base = f"newsletter_{today}"
-            txt_path = os.path.join("output", f"{fname_base}.txt")
-            html_path = os.path.join("output", f"{fname_base}.html")
-            with open(txt_path, "w") as f_txt:
-                f_txt.write(markdown_content)
-            with open(html_path, "w") as f_html:
-                f_html.write(html_content)
-
-            rss_path = os.path.join("public/rss", f"{today}.html")
-            with open(rss_path, "w") as f_rss:
-                f_rss.write(html_content)
-
-            issue = Issue(
-                date=today,
-                filename_html=html_path,
-                filename_txt=txt_path,
-                created_at=datetime.utcnow()
-            )
-            session.add(issue)
-            await session.commit()
\ No newline at end of file
+            written = None
+            if issue is not None:
+                written = await self._append(session, today, issue.id, paths, frames)
+                if written == []:
+                    return
+            if written is None:
+                written = await self._render(session, today, paths, frames)
+                if issue is not None:
+                    # The files were rewritten from scratch
+                    await session.execute(sa.delete(IssueItem).where(IssueItem.issue_id == issue.id))
+                    issue.item_count = 0
+
+            if issue is None:
+                issue = Issue(
+                    date=today,
+                    filename_html=paths["html"],
+                    filename_txt=paths["txt"],
+                    created_at=datetime.utcnow(),
+                    item_count=0,
+                )
+                session.add(issue)
+                await session.flush()
+            if written:
+                await session.execute(
+                    pg_insert(IssueItem).on_conflict_do_nothing(),
+                    [{"issue_id": issue.id, "commentary_id": c} for c in written],
+                )
+            issue.item_count += len(written)
+            issue.updated_at = datetime.utcnow()
+            await session.commit()
+        if self.store is not None:
+            self.store.prune()
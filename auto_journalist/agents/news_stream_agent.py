@@ -3,10 +3,10 @@ from datetime import datetime
 import sqlalchemy as sa
 from sqlalchemy import select
 from telegram import Bot
-from telegram.constants import ParseMode
 
 from ..db import get_session
-from ..models import Summary, FactCheck, Article, StreamItem
+from ..delivery import TelegramOutbox
+from ..models import Summary, FactCheck, Article, OutboxMessage, OutboxStatusEnum, StreamItem
 from .base_agent import BaseAgent
 
 
@@ -15,6 +15,7 @@ class NewsStreamAgent(BaseAgent):
         super().__init__()
         self.bot = Bot(token=os.getenv("TELEGRAM_TOKEN"))
         self.channel_id = channel_id or os.getenv("NEWS_STREAM_CHANNEL_ID")
+        self.outbox = TelegramOutbox(self.bot)
 
     def _extract_image(self, raw_json):
         if isinstance(raw_json, dict):
@@ -30,6 +31,33 @@ class NewsStreamAgent(BaseAgent):
         if not self.channel_id:
             self.logger.error("NEWS_STREAM_CHANNEL_ID not configured")
             return
+        await self.queue_new_items()
+        await self.deliver()
+
+    async def deliver(self):
+        """Send queued posts, then record when Telegram accepted them."""
+        stats = await self.outbox.deliver()
+        if stats["sent"]:
+            await self.record_sent()
+        return stats
+
+    async def record_sent(self):
+        """Copy the delivery time of sent posts from the outbox to their stream items."""
+        async for session in get_session():
+            await session.execute(
+                sa.update(StreamItem)
+                .where(
+                    StreamItem.outbox_id == OutboxMessage.id,
+                    StreamItem.sent_at.is_(None),
+                    OutboxMessage.status == OutboxStatusEnum.SENT,
+                )
+                .values(sent_at=OutboxMessage.sent_at)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def queue_new_items(self):
+        """Queue a post for every fact-checked summary not yet streamed."""
         async for session in get_session():
             stmt = (
                 select(Summary, Article, FactCheck)
@@ -40,26 +68,19 @@ class NewsStreamAgent(BaseAgent):
                 .order_by(Summary.created_at)
             )
             rows = (await session.execute(stmt)).all()
+            now = datetime.utcnow()
             for summary, article, fact in rows:
-                image_url = self._extract_image(article.raw_json)
                 text = (
                     f"{summary.summary_text}\n\n"
                     f"Source: {article.source}\n"
                     f"Fact check: {fact.status.value}"
                 )
-                if image_url:
-                    await self.bot.send_photo(
-                        chat_id=self.channel_id,
-                        photo=image_url,
-                        caption=text,
-                        parse_mode=ParseMode.MARKDOWN,
-                    )
-                else:
-                    await self.bot.send_message(
-                        chat_id=self.channel_id,
-                        text=text,
-                        parse_mode=ParseMode.MARKDOWN,
-                    )
-                stream = StreamItem(summary_id=summary.id, sent_at=datetime.utcnow())
-                session.add(stream)
-                await session.commit()
+                message = self.outbox.message(
+                    self.channel_id, text, photo_url=self._extract_image(article.raw_json)
+                )
+                # Recorded with its outbox message so nothing is queued twice;
+                # sent_at is filled in by record_sent once it is delivered
+                session.add(StreamItem(summary_id=summary.id, queued_at=now, outbox=message))
+            await session.commit()
+            self.count_processed(len(rows))
+            return len(rows)
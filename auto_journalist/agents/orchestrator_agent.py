@@ -1,13 +1,23 @@
 from .crawler_agent import CrawlerAgent
+from .cluster_agent import ClusterAgent
 from .summarizer_agent import SummarizerAgent
+from .topic_agent import TopicAgent
 from .factcheck_agent import FactCheckAgent
 from .commentary_agent import CommentaryAgent
+from .review_agent import ReviewAgent
 from .formatter_agent import FormatterAgent
 from .publisher_agent import PublisherAgent
 from .news_stream_agent import NewsStreamAgent
 from .bot_agent import BotAgent
 from .base_agent import BaseAgent
+from ..config import PIPELINE_STAGES, REVIEW_MERGED, STREAM_CLUSTER_RELOAD, STREAM_POLL_MIN
+from ..db import get_session, run_session
+from ..feed_schedule import FeedScheduler
+from ..metrics import metrics
+from ..models import Article, Summary
+from ..pipeline import Stage, run_pipeline
 
+import asyncio
 import os
 
 
@@ -15,9 +25,14 @@ class OrchestratorAgent(BaseAgent):
     def __init__(self):
         super().__init__()
         self.crawler = CrawlerAgent()
+        self.clusterer = ClusterAgent()
         self.summarizer = SummarizerAgent()
+        self.tagger = TopicAgent()
         self.factchecker = FactCheckAgent()
         self.commentator = CommentaryAgent()
+        self.reviewer = ReviewAgent(
+            factchecker=self.factchecker, commentator=self.commentator
+        )
         self.formatter = FormatterAgent()
         self.publisher = PublisherAgent()
         self.streamer = NewsStreamAgent()
@@ -26,35 +41,217 @@ class OrchestratorAgent(BaseAgent):
         telegram_token = os.getenv("TELEGRAM_TOKEN", "")
         self.bot_agent = BotAgent(telegram_token)
 
-    async def run_daily(self):
+    async def close(self):
+        # The crawler's parse processes would otherwise outlive the run
+        self.crawler.close_parse_executor()
+        await super().close()
+
+    async def run_daily(self, pipelined=False, merged=REVIEW_MERGED):
         """
         Run the entire daily pipeline:
         1. Crawl new articles
-        2. Summarize them
-        3. Fact-check
-        4. Add commentary
-        5. Format into newsletter
-        6. Publish via Telegram
+        2. Cluster near-duplicate stories
+        3. Summarize them
+        4. Tag their topics
+        5. Fact-check
+        6. Add commentary
+        7. Format into newsletter
+        8. Publish via Telegram
         Finally, close any shared OpenAI sessions.
+
+        With ``pipelined`` set, steps 1-6 run concurrently as a streaming
+        pipeline (see ``run_pipelined``). With ``merged`` set, steps 5 and 6
+        share one OpenAI request per summary (see ``ReviewAgent``).
         """
-        await self.crawler.run()
-        await self.summarizer.run()
-        await self.factchecker.run()
-        await self.commentator.run()
-        await self.formatter.run()
-        await self.publisher.run()
+        if pipelined:
+            await self.run_stage("pipeline", lambda: self.run_pipelined(merged=merged))
+            await self.run_stage("format", self.formatter.run)
+            await self.run_stage("publish", self.publisher.run)
+            await self.close()
+            return
+
+        # The stages run one after another, so they can share a connection
+        async with run_session():
+            await self.run_stage("crawl", self.crawler.run)
+            await self.run_stage("cluster", self.clusterer.run)
+            await self.run_stage("summarize", self.summarizer.run)
+            await self.run_stage("topics", self.tagger.run)
+            if merged:
+                await self.run_stage("review", self.reviewer.run)
+            else:
+                await self.run_stage("factcheck", self.factchecker.run)
+            # Also comments on summaries fact-checked by run_stream
+            await self.run_stage("commentary", self.commentator.run)
+            await self.run_stage("format", self.formatter.run)
+            await self.run_stage("publish", self.publisher.run)
 
         # Close the shared OpenAI session (so no unclosed client session warnings)
         await self.close()
 
-    async def run_stream(self):
+    async def _backlog(self):
+        """Ids left unprocessed by earlier runs, to seed each pipeline stage."""
+        queries = {
+            "summarize": self.summarizer.pending_articles().with_only_columns(Article.id),
+            "factcheck": self.factchecker.pending_summaries().with_only_columns(Summary.id),
+            "commentary": self.commentator.pending_summaries().with_only_columns(Summary.id),
+        }
+        async for session in get_session():
+            return {
+                stage: (await session.execute(stmt)).scalars().all()
+                for stage, stmt in queries.items()
+            }
+
+    async def run_pipelined(self, merged=False):
+        """
+        Crawl, cluster, summarize, tag, fact-check and comment as one
+        streaming pipeline. Stages are connected by bounded queues (sized by
+        PIPELINE_STAGES), so each article moves on as soon as the previous
+        stage is done with it instead of waiting for the whole table.
+        """
+        # Untagged summaries from earlier runs are tagged up front rather than
+        # seeded, since the topics stage feeds fact-checking
+        await self.tagger.run()
+        backlog = await self._backlog()
+
+        # Clustering keeps one session and its LSH index for the whole run
+        async for cluster_session in get_session():
+            await self.clusterer.load_window(cluster_session)
+            stages = self._stages(cluster_session, backlog, merged=merged)
+            await run_pipeline(self.crawler.crawl(), stages)
+
+    def _stages(self, cluster_session, backlog, commentary=True, merged=False):
+        """
+        Pipeline stages from clustering on, seeded with ``backlog`` ids. With
+        ``merged`` set, fact-checking and commentary run as one review stage;
+        the commentary stage then only works off its backlog.
+        """
+        async def cluster(article_ids):
+            return await self.clusterer.cluster_articles(cluster_session, article_ids)
+
+        stages = [
+            # cluster_session must not be used concurrently: one worker only
+            Stage(
+                "cluster",
+                cluster,
+                batch_size=50,
+                workers=1,
+                queue_size=PIPELINE_STAGES["cluster"]["queue_size"],
+            ),
+            Stage(
+                "summarize",
+                self.summarizer.process,
+                seed=backlog.get("summarize", ()),
+                **PIPELINE_STAGES["summarize"],
+            ),
+            Stage(
+                "topics",
+                self.tagger.process,
+                batch_size=20,
+                batched=True,
+                **PIPELINE_STAGES["topics"],
+            ),
+        ]
+        if merged:
+            stages.append(Stage(
+                "review",
+                self.reviewer.process,
+                seed=backlog.get("factcheck", ()),
+                **PIPELINE_STAGES["review"],
+            ))
+        else:
+            stages.append(Stage(
+                "factcheck",
+                self.factchecker.process_batch,
+                batch_size=max(self.factchecker.batch_size, 1),
+                batched=True,
+                seed=backlog.get("factcheck", ()),
+                **PIPELINE_STAGES["factcheck"],
+            ))
+        if commentary or merged:
+            stages.append(Stage(
+                "commentary",
+                self.commentator.process,
+                seed=backlog.get("commentary", ()),
+                **PIPELINE_STAGES["commentary"],
+            ))
+        return stages
+
+    async def run_stream(self, daemon=False):
         """Fetch new articles and immediately publish them to the news stream."""
-        await self.crawler.run()
-        await self.summarizer.run()
-        await self.factchecker.run()
-        await self.streamer.run()
+        if daemon:
+            await self.run_stream_daemon()
+            return
+        async with run_session():
+            await self.run_stage("crawl", self.crawler.run)
+            await self.run_stage("cluster", self.clusterer.run)
+            await self.run_stage("summarize", self.summarizer.run)
+            await self.run_stage("topics", self.tagger.run)
+            await self.run_stage("factcheck", self.factchecker.run)
+            await self.run_stage("stream", self.streamer.run)
         await self.close()
 
+    async def _stream_cycle(self, scheduler, http, cluster_session, backlog):
+        """Poll the feeds that are due and stream whatever they brought."""
+        async for session in get_session():
+            await scheduler.load(session, await self.crawler.gather_sources(session))
+        due = scheduler.due()
+        if due or any(backlog.values()):
+            stages = self._stages(cluster_session, backlog, commentary=False)
+            crawl = self.crawler.crawl(sources=due, http=http, on_feed=scheduler.record)
+            with metrics.timer("stage_seconds", stage="stream_cycle"):
+                await run_pipeline(crawl, stages)
+            await self.streamer.queue_new_items()
+        async for session in get_session():
+            await scheduler.save(session)
+            await session.commit()
+
+    async def _deliver_forever(self):
+        while True:
+            try:
+                await self.streamer.deliver()
+            except Exception:
+                self.logger.exception("Stream delivery failed")
+            await asyncio.sleep(1)
+
+    async def run_stream_daemon(self):
+        """
+        Stream continuously. Each feed is polled on its own adaptive
+        schedule (see ``FeedScheduler``) and new articles go straight
+        through clustering, summarization and fact-checking to the stream
+        channel, while queued posts are delivered in the background. The
+        HTTP session, DB pool and clustering window are reused across polls.
+        """
+        if not self.streamer.channel_id:
+            self.logger.error("NEWS_STREAM_CHANNEL_ID not configured")
+            return
+        scheduler = FeedScheduler()
+        # Catch up on whatever earlier runs left half-processed
+        await self.tagger.run()
+        backlog = await self._backlog()
+        backlog.pop("commentary", None)
+        loop = asyncio.get_running_loop()
+        delivery = asyncio.create_task(self._deliver_forever())
+        try:
+            async with self.crawler._open_http_session() as http:
+                while True:
+                    async for cluster_session in get_session():
+                        await self.clusterer.load_window(cluster_session)
+                        reload_at = loop.time() + STREAM_CLUSTER_RELOAD
+                        while loop.time() < reload_at:
+                            try:
+                                await self._stream_cycle(scheduler, http, cluster_session, backlog)
+                            except Exception:
+                                self.logger.exception("Stream cycle failed")
+                                # The session may be unusable; start over with a fresh window
+                                reload_at = 0
+                            backlog = {}
+                            await asyncio.sleep(
+                                max(1.0, min(scheduler.seconds_until_next(), STREAM_POLL_MIN))
+                            )
+        finally:
+            delivery.cancel()
+            await self.close()
+
     def run_bot(self):
         """
         Start the Telegram bot loop. This is synchronous (long-running loop),
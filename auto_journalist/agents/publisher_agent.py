@@ -1,61 +1,214 @@
+import asyncio
 import os
+import numpy as np
 import sqlalchemy as sa
 from sqlalchemy import select
 from telegram import Bot
-from telegram.constants import ParseMode
 import datetime
 
+from ..config import (
+    DIGEST_CACHE_MAX_BYTES,
+    EMBEDDING_MATCH_ENABLED,
+    EMBEDDING_MIN_SCORE,
+    EMBEDDING_WINDOW_DAYS,
+)
 from ..db import get_session
-from ..models import User, Preference, Summary, FactCheck, FrequencyEnum, FactStatusEnum
+from ..delivery import TelegramOutbox
+from ..embeddings import EmbeddingIndex
+from ..lru import LRUCache
+from ..models import (
+    User, Preference, Summary, SummaryTopic, Topic, FactCheck, FrequencyEnum, FactStatusEnum
+)
+from ..topics import normalize_topic
 from .base_agent import BaseAgent
 
+FREQUENCY_INTERVALS = {
+    FrequencyEnum.HOURLY: datetime.timedelta(hours=1),
+    FrequencyEnum.DAILY: datetime.timedelta(days=1),
+    FrequencyEnum.WEEKLY: datetime.timedelta(weeks=1),
+}
+
+# Summaries per digest
+DIGEST_SIZE = 5
+# Queued preferences are marked as sent in chunks of this size
+LAST_SENT_CHUNK = 100
+# Memory for cached preference topic embeddings
+TOPIC_VECTOR_CACHE_MAX_BYTES = 4 * 1024 * 1024
+
+
 class PublisherAgent(BaseAgent):
-    def __init__(self):
+    def __init__(self, use_embeddings=EMBEDDING_MATCH_ENABLED):
         super().__init__()
         self.bot = Bot(token=os.getenv("TELEGRAM_TOKEN"))
+        self.use_embeddings = use_embeddings
+        self.index = EmbeddingIndex() if use_embeddings else None
+        # Normalized preference topic -> unit embedding
+        self.topic_vectors = LRUCache(TOPIC_VECTOR_CACHE_MAX_BYTES, sizeof=lambda v: v.nbytes)
+        self.outbox = TelegramOutbox(self.bot)
+        # (topic, frequency, summary ids) -> digest text, shared across runs
+        self.digests = LRUCache(
+            DIGEST_CACHE_MAX_BYTES, sizeof=lambda text: len(text.encode("utf-8"))
+        )
 
-    async def run(self):
+    @staticmethod
+    def due_preferences(now):
+        """Preferences whose frequency interval has elapsed since last_sent."""
+        # One range condition per frequency keeps ix_preferences_frequency_last_sent usable
+        due = sa.or_(*[
+            sa.and_(
+                Preference.frequency == frequency,
+                sa.or_(
+                    Preference.last_sent.is_(None),
+                    Preference.last_sent <= now - interval,
+                ),
+            )
+            for frequency, interval in FREQUENCY_INTERVALS.items()
+        ])
+        return (
+            select(Preference.id, Preference.topic, Preference.frequency, User.telegram_id)
+            .join(User, User.id == Preference.user_id)
+            .where(due)
+        )
+
+    @staticmethod
+    def top_summaries(topics, limit=DIGEST_SIZE):
+        """
+        Latest ``limit`` verified summaries for each of ``topics`` (normalized
+        tag names) in one windowed query.
+        """
+        # Tag names resolve to topic ids, then ix_summary_topics_topic_id_summary_id
+        ranked = (
+            select(
+                Topic.name.label("topic"),
+                Summary.id,
+                Summary.summary_text,
+                FactCheck.status,
+                sa.func.row_number()
+                .over(partition_by=Topic.id, order_by=Summary.created_at.desc())
+                .label("rank"),
+            )
+            .join(SummaryTopic, SummaryTopic.topic_id == Topic.id)
+            .join(Summary, Summary.id == SummaryTopic.summary_id)
+            .join(FactCheck, FactCheck.summary_id == Summary.id)
+            .where(
+                Topic.name.in_(topics),
+                FactCheck.status == FactStatusEnum.VERIFIED
+            )
+            .subquery()
+        )
+        return (
+            select(ranked.c.topic, ranked.c.id, ranked.c.summary_text, ranked.c.status)
+            .where(ranked.c.rank <= limit)
+            .order_by(ranked.c.topic, ranked.c.rank)
+        )
+
+    @staticmethod
+    def candidate_summaries(since):
+        """Verified summaries created since ``since``, for embedding matches."""
+        return (
+            select(Summary.id, Summary.summary_text, FactCheck.status)
+            .join(FactCheck, FactCheck.summary_id == Summary.id)
+            .where(
+                Summary.created_at >= since,
+                FactCheck.status == FactStatusEnum.VERIFIED
+            )
+        )
+
+    def _topic_matrix(self, topics):
+        """Embeddings of ``topics`` as rows, embedding each topic only once."""
+        missing = [topic for topic in topics if topic not in self.topic_vectors]
+        if missing:
+            for topic, vector in zip(missing, self.index.embedder.embed(missing)):
+                self.topic_vectors.put(topic, vector)
+        return np.stack([
+            self.topic_vectors.get(topic)
+            if topic in self.topic_vectors else self.index.embedder.embed([topic])[0]
+            for topic in topics
+        ])
+
+    async def match_summaries(self, session, topics, now, limit=DIGEST_SIZE):
+        """
+        Most similar ``limit`` verified summaries for each of ``topics``
+        (normalized), scored for all topics at once against the embedding
+        index. Returns ``{topic: [(summary_id, text, status), ...]}``.
+        """
+        since = now - datetime.timedelta(days=EMBEDDING_WINDOW_DAYS)
+        rows = (await session.execute(self.candidate_summaries(since))).all()
+        if not rows or not topics:
+            return {}
+        # Embedding is CPU-bound; keep the event loop free for delivery
+        added = await asyncio.to_thread(
+            self.index.sync, [(summary_id, text) for summary_id, text, _ in rows]
+        )
+        if added:
+            self.logger.info(f"Embedded {added} new summaries")
+        summaries = {summary_id: (summary_id, text, status) for summary_id, text, status in rows}
+        topics = sorted(topics)
+        matches = self.index.search(self._topic_matrix(topics), limit, EMBEDDING_MIN_SCORE)
+        return {
+            topic: [summaries[summary_id] for summary_id, _ in found]
+            for topic, found in zip(topics, matches) if found
+        }
+
+    async def _mark_sent(self, session, pref_ids, now):
+        for start in range(0, len(pref_ids), LAST_SENT_CHUNK):
+            await session.execute(
+                sa.update(Preference)
+                .where(Preference.id.in_(pref_ids[start:start + LAST_SENT_CHUNK]))
+                .values(last_sent=now)
+            )
+
+    def render_digest(self, topic, frequency, items):
+        """
+        Digest text for ``items`` (``(summary_id, text, status)`` rows),
+        rendered once and reused for every subscriber of the same topic and
+        frequency while the summaries stay the same.
+        """
+        key = (topic, frequency, tuple(summary_id for summary_id, _, _ in items))
+        text = self.digests.get(key)
+        if text is None:
+            messages = [f"• {summary_text}\n_Fact:_ {status.value}\n" for _, summary_text, status in items]
+            text = f"Your {frequency.value.title()} News on '{topic}':\n\n" + "\n".join(messages)
+            self.digests.put(key, text)
+        return text
+
+    async def queue_digests(self):
+        """
+        Queue a digest for every due preference in the outbox and mark the
+        preferences as sent in the same transaction, so each digest is
+        queued exactly once. Returns the number of digests queued.
+        """
         async for session in get_session():
-            users = (await session.execute(sa.select(User))).scalars().all()
-            for user in users:
-                for pref in user.preferences:
-                    now = datetime.datetime.utcnow()
-                    last = pref.last_sent
-                    if last:
-                        elapsed = (now - last).total_seconds()
-                        if pref.frequency == FrequencyEnum.HOURLY and elapsed < 3600:
-                            continue
-                        if pref.frequency == FrequencyEnum.DAILY and elapsed < 86400:
-                            continue
-                        if pref.frequency == FrequencyEnum.WEEKLY and elapsed < 604800:
-                            continue
-
-                    stmt = (
-                        select(Summary, FactCheck)
-                        .join(FactCheck, FactCheck.summary_id == Summary.id)
-                        .where(
-                            Summary.topic.ilike(pref.topic),
-                            FactCheck.status == FactStatusEnum.VERIFIED
-                        )
-                        .order_by(Summary.created_at.desc())
-                        .limit(5)
-                    )
-                    rows = (await session.execute(stmt)).all()
-                    if not rows:
-                        continue
-
-                    messages = []
-                    for summary, factcheck in rows:
-                        messages.append(
-                            f"• {summary.summary_text}\n_Fact:_ {factcheck.status.value}\n"
-                        )
-
-                    text = f"Your {pref.frequency.value.title()} News on '{pref.topic}':\n\n" + "\n".join(messages)
-                    await self.bot.send_message(
-                        chat_id=int(user.telegram_id),
-                        text=text,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-
-                    pref.last_sent = now
-                    await session.commit()
\ No newline at end of file
+            now = datetime.datetime.utcnow()
+            prefs = (await session.execute(self.due_preferences(now))).all()
+            if not prefs:
+                return 0
+
+            topics = {normalize_topic(pref.topic) for pref in prefs}
+            if self.use_embeddings:
+                items = await self.match_summaries(session, topics, now)
+            else:
+                items = {}
+                for topic, summary_id, summary_text, status in (await session.execute(self.top_summaries(topics))).all():
+                    items.setdefault(topic, []).append((summary_id, summary_text, status))
+
+            queued = []
+            for pref_id, pref_topic, frequency, telegram_id in prefs:
+                topic_items = items.get(normalize_topic(pref_topic))
+                if not topic_items:
+                    continue
+
+                text = self.render_digest(pref_topic, frequency, topic_items)
+                session.add(self.outbox.message(telegram_id, text))
+                queued.append(pref_id)
+
+            await self._mark_sent(session, queued, now)
+            await session.commit()
+            return len(queued)
+
+    async def run(self):
+        queued = await self.queue_digests()
+        self.count_processed(queued)
+        self.logger.info(f"Queued {queued} digests (digest cache hit rate {self.digests.hit_rate:.0%})")
+        # Also sends anything a previous run left undelivered
+        await self.outbox.deliver()
@@ -0,0 +1,142 @@
+import asyncio
+import json
+
+from ..config import REVIEW_COMMIT_BATCH, REVIEW_CONCURRENCY
+from ..db import get_session
+from ..models import Summary, FactCheck, Commentary, FactStatusEnum
+from ..payload import strip_code_fence, summary_payload
+from .base_agent import BaseAgent
+from .commentary_agent import CommentaryAgent
+from .factcheck_agent import FactCheckAgent
+
+# Completion budget for the verdict and the commentary paragraph together
+REVIEW_MAX_TOKENS = 400
+
+REVIEW_FORMAT = (
+    '{"status": "verified" | "disputed" | "not_verifiable", "citations": [...], '
+    '"commentary": <single paragraph>}'
+)
+
+
+def parse_review(content):
+    """Map a structured review reply to ``(status, citations, commentary)``; raise ValueError if invalid."""
+    data = json.loads(strip_code_fence(content))
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    status = FactStatusEnum(data.get("status", "not_verifiable"))
+    citations = data.get("citations") or []
+    if not isinstance(citations, list):
+        raise ValueError("citations must be a list")
+    commentary = data.get("commentary")
+    if not isinstance(commentary, str) or not commentary.strip():
+        raise ValueError("missing commentary")
+    return status, [str(c) for c in citations], commentary.strip()
+
+
+class ReviewAgent(BaseAgent):
+    """
+    Fact-checks a summary and writes its commentary from one structured
+    OpenAI response, storing the FactCheck and Commentary rows together.
+    Replies that cannot be parsed fall back to the separate agents.
+    """
+
+    def __init__(self, model_name="gpt-4o", concurrency=REVIEW_CONCURRENCY,
+                 commit_batch=REVIEW_COMMIT_BATCH, factchecker=None, commentator=None):
+        super().__init__()
+        self.model = model_name
+        self.concurrency = concurrency
+        self.commit_batch = commit_batch
+        self.factchecker = factchecker or FactCheckAgent()
+        self.commentator = commentator or CommentaryAgent()
+
+    async def review(self, summary_text, summary_id):
+        """
+        Return ``(status, citations, commentary)`` for one summary, or None
+        if no commentary could be written.
+        """
+        prompt = [
+            {"role": "system", "content": "You are a fact-checking and commentary engine."},
+            {
+                "role": "user",
+                "content": (
+                    "Check the following summary against reputable sources such as Wikipedia, "
+                    "then provide a single-paragraph contextual analysis in a neutral yet engaging "
+                    "tone that takes your verdict into account. Mention historical parallels, "
+                    "market impact, or societal angles as relevant. "
+                    f"Respond with only a JSON object:\n{REVIEW_FORMAT}\n\n"
+                    f"Summary:\n{summary_text}"
+                ),
+            },
+        ]
+        response = await self.call_openai(
+            model=self.model,
+            messages=prompt,
+            max_tokens=REVIEW_MAX_TOKENS,
+            response_format={"type": "json_object"},
+        )
+        if response is None:
+            self.logger.error(f"Skipping review for summary_id={summary_id} due to OpenAI failure.")
+            return None
+        try:
+            result = parse_review(response.choices[0].message.content)
+            self.count_processed()
+            return result
+        except (ValueError, TypeError) as e:
+            self.logger.warning(
+                f"Bad review response for summary_id={summary_id} ({e!r}); using separate calls."
+            )
+        status, citations, _ = await self.factchecker.fact_check(summary_text, summary_id)
+        commentary = await self.commentator.generate_commentary(summary_text, status, summary_id)
+        if commentary is None:
+            return None
+        return status, citations, commentary
+
+    def pending_summaries(self):
+        return self.factchecker.pending_summaries()
+
+    @staticmethod
+    def _add_rows(session, summary_id, status, citations, commentary):
+        session.add(FactCheck(summary_id=summary_id, status=status, citations=citations))
+        session.add(Commentary(summary_id=summary_id, commentary_text=commentary))
+
+    async def process(self, summary_id):
+        """
+        Review and store one summary. Returns an empty list, for use as the
+        last pipeline stage: the summary needs no further processing.
+        """
+        async for session in get_session():
+            summary = await session.get(Summary, summary_id)
+        if summary is None:
+            return []
+        result = await self.review(summary_payload(summary), summary_id)
+        if result is None:
+            return []
+        async for session in get_session():
+            self._add_rows(session, summary_id, *result)
+            await session.commit()
+        return []
+
+    async def run(self):
+        async for session in get_session():
+            result = await session.execute(self.pending_summaries())
+            summaries = result.scalars().all()
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def review(summary):
+                async with semaphore:
+                    return summary.id, await self.review(summary_payload(summary), summary.id)
+
+            # Commit in batches so a crash only loses the current batch
+            pending = 0
+            for next_review in asyncio.as_completed([review(s) for s in summaries]):
+                summary_id, result = await next_review
+                if result is None:
+                    continue
+                self._add_rows(session, summary_id, *result)
+                pending += 1
+                if pending >= self.commit_batch:
+                    await session.commit()
+                    pending = 0
+
+            await session.commit()
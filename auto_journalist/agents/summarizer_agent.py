@@ -1,55 +1,265 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 import sqlalchemy as sa
 from sqlalchemy import select
+from ..config import (
+    SUMMARY_CONCURRENCY,
+    SUMMARY_COMMIT_BATCH,
+    SUMMARY_MAX_INPUT_TOKENS,
+    WORK_QUEUE_ENABLED,
+)
 from ..db import get_session
-from ..models import Article, Summary
+from ..jobqueue import JobQueue
+from ..models import Article, StoryCluster, Summary
+from ..payload import compact_article, strip_code_fence
 from .base_agent import BaseAgent
 
+# Completion budget per summary, also used to reserve rate-limit headroom
+SUMMARY_MAX_TOKENS = 300
+
+SUMMARY_FORMAT = (
+    '{"summary": ["<bullet>", ...], "author": "<name>" | null, '
+    '"publish_date": "YYYY-MM-DD" | null, "topic": "<one to three word topic tag>"}'
+)
+MAX_AUTHOR_LENGTH = 200
+MAX_TOPIC_LENGTH = 60
+
+
+def _parse_date(value):
+    """Naive UTC datetime from an ISO 8601 or RFC 822 date string, or None."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _clean_text(value, max_length):
+    if not isinstance(value, str):
+        return None
+    value = " ".join(value.split())
+    return value[:max_length] or None
+
+
+def parse_summary(content, entry=None):
+    """
+    Validate a structured summary reply into ``Summary`` column values.
+
+    ``author`` and ``publish_date`` fall back to the feed ``entry`` when the
+    model leaves them out. Raises ValueError if the reply is not a JSON
+    object with a non-empty summary.
+    """
+    data = json.loads(strip_code_fence(content))
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    bullets = data.get("summary")
+    if isinstance(bullets, str):
+        bullets = [line.lstrip("-• ").strip() for line in bullets.splitlines()]
+    if not isinstance(bullets, list):
+        raise ValueError("summary must be a list of bullets")
+    bullets = [b.strip() for b in bullets if isinstance(b, str) and b.strip()]
+    if not bullets:
+        raise ValueError("empty summary")
+
+    entry = entry if isinstance(entry, dict) else {}
+    return {
+        "summary_text": "\n".join(f"- {bullet}" for bullet in bullets),
+        "author": (
+            _clean_text(data.get("author"), MAX_AUTHOR_LENGTH)
+            or _clean_text(entry.get("author"), MAX_AUTHOR_LENGTH)
+        ),
+        "publish_date": (
+            _parse_date(data.get("publish_date"))
+            or _parse_date(entry.get("published") or entry.get("updated"))
+        ),
+        "topic": _clean_text(data.get("topic"), MAX_TOPIC_LENGTH),
+    }
+
 class SummarizerAgent(BaseAgent):
-    def __init__(self, model_name="gpt-4o"):
+    def __init__(
+        self,
+        model_name="gpt-4o",
+        concurrency=SUMMARY_CONCURRENCY,
+        commit_batch=SUMMARY_COMMIT_BATCH,
+        max_input_tokens=SUMMARY_MAX_INPUT_TOKENS,
+        use_queue=WORK_QUEUE_ENABLED,
+    ):
         super().__init__()
         self.model = model_name
+        self.concurrency = concurrency
+        self.commit_batch = commit_batch
+        self.max_input_tokens = max_input_tokens
+        self.use_queue = use_queue
+        self.token_stats = {"articles": 0, "raw_tokens": 0, "compact_tokens": 0}
+
+    def build_payload(self, article_json, source=None):
+        """Reduce a raw feed entry to the fields the summary needs."""
+        text, raw_tokens, compact_tokens = compact_article(
+            article_json, source, self.max_input_tokens, self.model
+        )
+        self.token_stats["articles"] += 1
+        self.token_stats["raw_tokens"] += raw_tokens
+        self.token_stats["compact_tokens"] += compact_tokens
+        return text
 
-    async def summarize_article(self, article_json, article_id):
+    async def summarize_article(self, article_json, article_id, source=None):
+        """
+        Summarize an article in one structured call. Returns the ``Summary``
+        column values (see ``parse_summary``), or None if OpenAI failed.
+        """
+        payload = self.build_payload(article_json, source)
         prompt = [
             {"role": "system", "content": "You are a summarization engine."},
             {
                 "role": "user",
                 "content": (
                     "Summarize the following article in no more than 120 words as bullet points. "
-                    "Include source, author, publish date, and a topic tag.\n\n"
-                    f"Article data: {article_json}"
+                    "Also extract its author, publish date and a topic tag. "
+                    f"Respond with only a JSON object:\n{SUMMARY_FORMAT}\n\n"
+                    f"Article data:\n{payload}"
                 ),
             },
         ]
         response = await self.call_openai(
             model=self.model,
             messages=prompt,
-            max_tokens=300
+            max_tokens=SUMMARY_MAX_TOKENS,
+            response_format={"type": "json_object"},
         )
         if response is None:
             self.logger.error(f"Skipping summary for article_id={article_id} due to OpenAI failure.")
             return None
-        return response.choices[0].message.content
+        content = response.choices[0].message.content
+        if not (content or "").strip():
+            self.logger.error(f"Skipping summary for article_id={article_id}: empty response.")
+            return None
+        try:
+            fields = parse_summary(content, article_json)
+        except (ValueError, TypeError) as e:
+            # Keep the text rather than paying for a second call
+            try:
+                fields = parse_summary(json.dumps({"summary": content}), article_json)
+            except ValueError:
+                # Nothing but bullet markers and whitespace
+                self.logger.error(
+                    f"Skipping summary for article_id={article_id}: no usable text ({e!r})."
+                )
+                return None
+            self.logger.warning(
+                f"Unstructured summary for article_id={article_id} ({e!r}); storing it as text."
+            )
+        self.count_processed()
+        return fields
 
-    async def run(self):
+    def pending_articles(self):
+        """Articles with no Summary, skipping near-duplicates whose story is
+        summarized via its cluster representative."""
+        return (
+            select(Article)
+            .outerjoin(Summary, Summary.article_id == Article.id)
+            .outerjoin(StoryCluster, StoryCluster.id == Article.cluster_id)
+            .where(
+                Summary.id.is_(None),
+                sa.or_(
+                    Article.cluster_id.is_(None),
+                    StoryCluster.representative_article_id == Article.id,
+                ),
+            )
+        )
+
+    async def _summarize_with_quota(self, article):
+        # Keep enough quota for every in-flight worker
+        await self.wait_for_openai_quota(
+            requests=self.concurrency,
+            tokens=self.concurrency * (SUMMARY_MAX_TOKENS + self.max_input_tokens),
+        )
+        return await self.summarize_article(article.raw_json, article.id, article.source)
+
+    async def process(self, article_id):
+        """
+        Summarize and store a single article. Returns the new summary id in a
+        list (empty if the article was skipped), for use as a pipeline stage.
+        """
+        async for session in get_session():
+            article = await session.get(Article, article_id)
+        if article is None:
+            return []
+        fields = await self._summarize_with_quota(article)
+        if fields is None:
+            return []
         async for session in get_session():
-            # Select all articles with no corresponding Summary
-            stmt = (
-                select(Article)
-                .outerjoin(Summary, Summary.article_id == Article.id)
-                .where(Summary.id.is_(None))
+            summary = Summary(
+                article_id=article.id,
+                cluster_id=article.cluster_id,
+                **fields,
             )
-            result = await session.execute(stmt)
+            session.add(summary)
+            await session.commit()
+            return [summary.id]
+
+    async def run_queued(self, forever=False):
+        """Summarize through the shared job queue, alongside other workers."""
+        await JobQueue("summarize").work(
+            self.process,
+            self.pending_articles().with_only_columns(Article.id),
+            batch=self.concurrency,
+            forever=forever,
+        )
+
+    async def run(self):
+        if self.use_queue:
+            await self.run_queued()
+            return
+        async for session in get_session():
+            result = await session.execute(self.pending_articles())
             articles = result.scalars().all()
 
-            for article in articles:
-                summary_text = await self.summarize_article(article.raw_json, article.id)
-                if summary_text is None:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            self.token_stats = dict.fromkeys(self.token_stats, 0)
+
+            async def summarize(article):
+                async with semaphore:
+                    return article, await self._summarize_with_quota(article)
+
+            # Commit in batches so a crash only loses the current batch
+            pending = 0
+            tasks = [summarize(article) for article in articles]
+            for next_summary in asyncio.as_completed(tasks):
+                article, fields = await next_summary
+                if fields is None:
                     continue  # skip if OpenAI failed
                 summary = Summary(
                     article_id=article.id,
-                    summary_text=summary_text
+                    cluster_id=article.cluster_id,
+                    **fields,
                 )
                 session.add(summary)
+                pending += 1
+                if pending >= self.commit_batch:
+                    await session.commit()
+                    pending = 0
 
             await session.commit()
+            self._log_token_savings()
+
+    def _log_token_savings(self):
+        stats = self.token_stats
+        if not stats["articles"]:
+            return
+        saved = stats["raw_tokens"] - stats["compact_tokens"]
+        self.logger.info(
+            f"Compacted {stats['articles']} article payloads from "
+            f"{stats['raw_tokens']} to {stats['compact_tokens']} tokens "
+            f"({saved} saved, {saved / max(stats['raw_tokens'], 1):.0%})"
+        )
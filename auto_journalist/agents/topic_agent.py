@@ -0,0 +1,121 @@
+import time
+
+import sqlalchemy as sa
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from ..config import TOPIC_BATCH_SIZE, TOPIC_VOCABULARY_TTL
+from ..db import get_session
+from ..models import Preference, Summary, SummaryTopic, Topic
+from ..topics import TopicClassifier, normalize_topic
+from .base_agent import BaseAgent
+
+
+class TopicAgent(BaseAgent):
+    """
+    Tags summaries with normalized topics in ``summary_topics``, so digests
+    can be matched to preferences through ix_summary_topics_topic_id_summary_id
+    instead of comparing free-text topics. Also fills in ``Summary.topic``
+    with the main tag when the summarizer left it empty.
+    """
+
+    def __init__(self, batch_size=TOPIC_BATCH_SIZE, vocabulary_ttl=TOPIC_VOCABULARY_TTL):
+        super().__init__()
+        self.batch_size = batch_size
+        self.vocabulary_ttl = vocabulary_ttl
+        self.classifier = TopicClassifier()
+        self._vocabulary_loaded_at = None
+
+    async def load_vocabulary(self, session):
+        """Teach the classifier the topics users subscribed to, at most every vocabulary_ttl seconds."""
+        now = time.monotonic()
+        if self._vocabulary_loaded_at is not None and now - self._vocabulary_loaded_at < self.vocabulary_ttl:
+            return
+        result = await session.execute(select(Preference.topic).distinct())
+        self.classifier = TopicClassifier(vocabulary=result.scalars().all())
+        self._vocabulary_loaded_at = now
+
+    def pending_summaries(self):
+        return (
+            select(Summary.id, Summary.summary_text, Summary.topic)
+            .outerjoin(SummaryTopic, SummaryTopic.summary_id == Summary.id)
+            .where(SummaryTopic.summary_id.is_(None))
+        )
+
+    async def _topic_ids(self, session, names):
+        await session.execute(
+            pg_insert(Topic)
+            .values([{"name": name} for name in names])
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        result = await session.execute(select(Topic.name, Topic.id).where(Topic.name.in_(names)))
+        return dict(result.all())
+
+    async def tag(self, session, rows):
+        """
+        Classify ``(id, summary_text, topic)`` rows and store their tags (not
+        committed). Returns the number of summaries tagged.
+        """
+        if not rows:
+            return 0
+        await self.load_vocabulary(session)
+        tags = {}
+        for summary_id, summary_text, topic in rows:
+            found = self.classifier.classify(summary_text or "")
+            # A topic set upstream wins over the classifier's guesses
+            main = normalize_topic(topic)
+            if main:
+                found = ([main] + [t for t in found if t != main])[:self.classifier.max_topics]
+            tags[summary_id] = found
+
+        topic_ids = await self._topic_ids(session, sorted({t for found in tags.values() for t in found}))
+        await session.execute(
+            pg_insert(SummaryTopic)
+            .values([
+                {"summary_id": summary_id, "topic_id": topic_ids[t]}
+                for summary_id, found in tags.items() for t in found
+            ])
+            .on_conflict_do_nothing()
+        )
+        untopiced = [
+            {"b_id": summary_id, "b_topic": tags[summary_id][0]}
+            for summary_id, _, topic in rows if not topic
+        ]
+        if untopiced:
+            summaries = Summary.__table__
+            await session.execute(
+                sa.update(summaries)
+                .where(summaries.c.id == sa.bindparam("b_id"), summaries.c.topic.is_(None))
+                .values(topic=sa.bindparam("b_topic")),
+                untopiced,
+            )
+        self.count_processed(len(tags))
+        return len(tags)
+
+    async def process(self, summary_ids):
+        """
+        Tag a batch of summaries by id. Returns the ids unchanged, for use as
+        a pipeline stage between summarization and fact-checking.
+        """
+        async for session in get_session():
+            result = await session.execute(
+                select(Summary.id, Summary.summary_text, Summary.topic)
+                .where(Summary.id.in_(summary_ids))
+            )
+            await self.tag(session, result.all())
+            await session.commit()
+        return summary_ids
+
+    async def run(self):
+        """Tag every summary that has no topics yet."""
+        tagged = 0
+        async for session in get_session():
+            while True:
+                result = await session.execute(self.pending_summaries().limit(self.batch_size))
+                rows = result.all()
+                if not rows:
+                    break
+                tagged += await self.tag(session, rows)
+                await session.commit()
+        if tagged:
+            self.logger.info(f"Tagged {tagged} summaries")
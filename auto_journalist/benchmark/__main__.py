@@ -0,0 +1,240 @@
+"""
+Offline end-to-end benchmark of the agent pipelines.
+
+    python -m auto_journalist.benchmark --database-url postgresql://localhost/aj_bench
+
+Runs run_daily (sequential, pipelined and with the merged review stage),
+run_stream and the crypto pipeline against local stand-ins for RSS feeds,
+OpenAI and Telegram, and reports throughput per stage, end-to-end latency
+and DB query counts. The benchmark database is dropped and recreated before
+every scenario, so never point it at a database you care about.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import click
+
+from .stubs import TOPICS, FakeOpenAI, FakeTelegram, FeedServer
+
+SCENARIOS = ["daily", "daily_pipelined", "daily_merged", "stream", "crypto"]
+
+BENCH_TOKEN = "123456:bench"
+STREAM_CHANNEL = "-100100"
+CRYPTO_CHAT = "-100200"
+
+
+def _configure(database_url, workdir, group_rate):
+    """Point the agents at the benchmark environment; must precede their import."""
+    os.environ.update(
+        TELEGRAM_GROUP_RATE_PER_MIN=str(group_rate),
+        DATABASE_URL=database_url,
+        OPENAI_API_KEY="bench",
+        TELEGRAM_TOKEN=BENCH_TOKEN,
+        NEWS_STREAM_CHANNEL_ID=STREAM_CHANNEL,
+        CRYPTO_TELEGRAM_CHAT_ID=CRYPTO_CHAT,
+        # Every scenario should pay for its OpenAI calls
+        LLM_CACHE_ENABLED="false",
+        SEEN_URL_FILTER_PATH=os.path.join(workdir, "seen_urls.bloom"),
+        FORMATTER_BYTECODE_CACHE_DIR=os.path.join(workdir, "jinja_cache"),
+        FORMATTER_FRAGMENT_CACHE_DIR=os.path.join(workdir, "fragment_cache"),
+        METRICS_REPORT_DIR=os.path.join(workdir, "reports"),
+    )
+    # The formatter writes its issue relative to the working directory
+    os.chdir(workdir)
+
+
+async def _reset_database(users):
+    from ..db import AsyncSessionLocal, engine
+    from ..models import Base, FrequencyEnum, Preference, User
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        for n in range(users):
+            user = User(telegram_id=str(1000 + n))
+            session.add(user)
+            await session.flush()
+            session.add(Preference(
+                user_id=user.id, topic=TOPICS[n % len(TOPICS)], frequency=FrequencyEnum.DAILY
+            ))
+        await session.commit()
+    seen_filter = os.environ["SEEN_URL_FILTER_PATH"]
+    if os.path.exists(seen_filter):
+        os.remove(seen_filter)
+
+
+def _use_fake_telegram(agents, base_url):
+    from telegram import Bot
+
+    bot = Bot(token=BENCH_TOKEN, base_url=f"{base_url}/bot")
+    for agent in agents:
+        if getattr(agent, "bot", None) is not None:
+            agent.bot = bot
+        if getattr(agent, "outbox", None) is not None:
+            agent.outbox.bot = bot
+
+
+def _build(scenario, feeds, crypto_feeds, telegram_url):
+    """Return the coroutine function running ``scenario`` with local sources."""
+    from ..agents.crawler_agent import CrawlerAgent
+    from ..agents.crypto_orchestrator import CryptoOrchestrator
+    from ..agents.orchestrator_agent import OrchestratorAgent
+    from ..config import CRAWL_CONCURRENCY
+
+    # Every stand-in feed lives on one host
+    per_host = CRAWL_CONCURRENCY
+    if scenario == "crypto":
+        orchestrator = CryptoOrchestrator()
+        orchestrator.crawler = CrawlerAgent(sources=crypto_feeds, per_host_limit=per_host)
+        _use_fake_telegram([orchestrator.crypto_agent], telegram_url)
+        return orchestrator.run_once
+
+    orchestrator = OrchestratorAgent()
+    orchestrator.crawler = CrawlerAgent(sources=feeds, per_host_limit=per_host)
+    _use_fake_telegram([orchestrator.publisher, orchestrator.streamer], telegram_url)
+    if scenario == "daily":
+        return orchestrator.run_daily
+    if scenario == "daily_pipelined":
+        return lambda: orchestrator.run_daily(pipelined=True)
+    if scenario == "daily_merged":
+        return lambda: orchestrator.run_daily(merged=True)
+    return orchestrator.run_stream
+
+
+def _latency(report, timer):
+    return next(
+        ({"p50": t["p50"], "p95": t["p95"]} for t in report["timers"] if t["name"] == timer),
+        None,
+    )
+
+
+def _summarize(report, elapsed, articles, stubs):
+    """Condense a metrics report into per-stage throughput and totals."""
+    stages = {
+        t["labels"]["stage"]: t["sum"]
+        for t in report["timers"] if t["name"] == "stage_seconds"
+    }
+    processed = {}
+    db_queries = 0
+    for counter in report["counters"]:
+        if counter["name"] == "items_processed_total":
+            processed[counter["labels"]["agent"]] = counter["value"]
+        elif counter["name"] == "db_queries_total":
+            db_queries += counter["value"]
+    return {
+        "elapsed_seconds": elapsed,
+        "articles": articles,
+        "articles_per_second": articles / elapsed if elapsed else 0.0,
+        "stage_seconds": stages,
+        "stage_articles_per_second": {
+            stage: articles / seconds for stage, seconds in stages.items() if seconds
+        },
+        "items_processed": processed,
+        "db_queries": db_queries,
+        "openai_latency": _latency(report, "openai_request_seconds"),
+        "db_pool_wait": _latency(report, "db_pool_wait_seconds"),
+        "stubs": stubs,
+    }
+
+
+async def _run(scenarios, feeds, entries, users, openai_latency, openai_rpm, group_rate):
+    from ..db import get_session
+    from ..metrics import metrics
+    from ..models import Article
+    import openai
+    import sqlalchemy as sa
+
+    feed_server = FeedServer(feeds, entries)
+    crypto_server = FeedServer(2, entries, duplicate_rate=0.0, seed=1)
+    fake_openai = FakeOpenAI(latency=openai_latency, rpm=openai_rpm)
+    fake_telegram = FakeTelegram(group_rate_per_min=group_rate)
+    await feed_server.start()
+    await crypto_server.start()
+    openai.api_base = f"{await fake_openai.start()}/v1"
+    telegram_url = await fake_telegram.start()
+
+    # CryptoTrendAgent only looks at summaries from the configured crypto sources
+    from ..config import CRYPTO_SOURCES
+    crypto_feeds = [
+        dict(src, url=local["url"])
+        for src, local in zip(CRYPTO_SOURCES, crypto_server.sources())
+    ]
+
+    results = {}
+    try:
+        for scenario in scenarios:
+            await _reset_database(users)
+            run = _build(scenario, feed_server.sources(), crypto_feeds, telegram_url)
+            before = (fake_openai.requests, fake_openai.rate_limited,
+                      fake_telegram.delivered, fake_telegram.flood_errors)
+            metrics.reset()
+            start = time.perf_counter()
+            await run()
+            elapsed = time.perf_counter() - start
+            async for session in get_session():
+                articles = (await session.execute(
+                    sa.select(sa.func.count()).select_from(Article)
+                )).scalar_one()
+            stubs = {
+                "openai_requests": fake_openai.requests - before[0],
+                "openai_rate_limited": fake_openai.rate_limited - before[1],
+                "telegram_delivered": fake_telegram.delivered - before[2],
+                "telegram_flood_errors": fake_telegram.flood_errors - before[3],
+            }
+            results[scenario] = _summarize(metrics.report(), elapsed, articles, stubs)
+            click.echo(
+                f"{scenario:>16}: {elapsed:7.1f}s  {articles} articles  "
+                f"{results[scenario]['articles_per_second']:.1f} articles/s  "
+                f"{results[scenario]['db_queries']:.0f} queries"
+            )
+    finally:
+        for server in (feed_server, crypto_server, fake_openai, fake_telegram):
+            await server.stop()
+    return results
+
+
+@click.command()
+@click.option("--database-url", required=True,
+              help="Scratch Postgres database; it is wiped before every scenario.")
+@click.option("--scenario", "scenarios", multiple=True, type=click.Choice(SCENARIOS),
+              help="Scenario to run (repeatable); defaults to all.")
+@click.option("--feeds", default=200, show_default=True, help="Synthetic RSS feeds.")
+@click.option("--entries", default=10, show_default=True, help="Entries per feed.")
+@click.option("--users", default=500, show_default=True, help="Subscribers to publish digests to.")
+@click.option("--openai-latency", default=0.2, show_default=True, help="Seconds per completion.")
+@click.option("--openai-rpm", default=3000, show_default=True, help="Requests per minute before 429s.")
+@click.option("--telegram-group-rate", default=600, show_default=True,
+              help="Messages per minute allowed to the stream channel (Telegram allows ~20).")
+@click.option("--output", type=click.Path(dir_okay=False),
+              help="Write the JSON results here (default: benchmark_<timestamp>.json).")
+def main(database_url, scenarios, feeds, entries, users, openai_latency, openai_rpm,
+         telegram_group_rate, output):
+    output = os.path.abspath(
+        output or f"benchmark_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    workdir = tempfile.mkdtemp(prefix="aj_bench_")
+    _configure(database_url, workdir, telegram_group_rate)
+    results = asyncio.run(_run(
+        list(scenarios) or SCENARIOS, feeds, entries, users, openai_latency, openai_rpm,
+        telegram_group_rate,
+    ))
+    with open(output, "w") as f:
+        json.dump({
+            "generated_at": datetime.utcnow().isoformat(),
+            "parameters": {
+                "feeds": feeds, "entries": entries, "users": users,
+                "openai_latency": openai_latency, "openai_rpm": openai_rpm,
+                "telegram_group_rate": telegram_group_rate,
+            },
+            "scenarios": results,
+        }, f, indent=2)
+    click.echo(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Local stand-ins for the external services used by the agents: RSS feeds,
+the OpenAI chat completion API and the Telegram Bot API. Each one is a small
+aiohttp application that records what it served.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+TOPICS = ["technology", "politics", "business", "science", "health", "sports", "crypto"]
+
+_WORDS = (
+    "market government research company election energy climate network "
+    "policy startup vaccine league bitcoin regulation court budget satellite "
+    "chip factory union protest trade inflation model data security launch"
+).split()
+
+
+class _Bucket:
+    """Non-blocking token bucket: ``take`` returns the seconds to wait, or 0."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Server:
+    def __init__(self):
+        self.runner = None
+        self.url = None
+
+    def app(self):
+        raise NotImplementedError
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+def _paragraph(rng, topic, words=80):
+    return " ".join([topic] + [rng.choice(_WORDS) for _ in range(words)]) + "."
+
+
+class FeedServer(_Server):
+    """
+    Serves ``feeds`` synthetic RSS feeds of ``entries`` items each at
+    ``/feeds/<n>.xml``, with ETags so conditional GETs are exercised. About
+    ``duplicate_rate`` of the entries repeat a story from another feed, for
+    the clustering stage.
+    """
+
+    def __init__(self, feeds, entries, duplicate_rate=0.2, seed=0):
+        super().__init__()
+        self.feeds = feeds
+        self.entries = entries
+        self.duplicate_rate = duplicate_rate
+        self.seed = seed
+        self.requests = 0
+        self.not_modified = 0
+        self._bodies = {}
+
+    def sources(self, prefix="Bench"):
+        return [
+            {"name": f"{prefix}_{n}", "url": f"{self.url}/feeds/{n}.xml", "is_social": False}
+            for n in range(self.feeds)
+        ]
+
+    def _story(self, rng, feed_no, item_no):
+        if feed_no and rng.random() < self.duplicate_rate:
+            # Same story as item_no of feed 0
+            story_rng = random.Random(f"{self.seed}-0-{item_no}")
+            key = f"0-{item_no}"
+        else:
+            story_rng = rng
+            key = f"{feed_no}-{item_no}"
+        topic = story_rng.choice(TOPICS)
+        title = f"{topic.title()}: {' '.join(story_rng.choice(_WORDS) for _ in range(6))}"
+        body = " ".join(_paragraph(story_rng, topic) for _ in range(3))
+        return key, title, body
+
+    def feed_xml(self, feed_no):
+        rng = random.Random(f"{self.seed}-{feed_no}")
+        now = datetime.utcnow()
+        items = []
+        for item_no in range(self.entries):
+            key, title, body = self._story(rng, feed_no, item_no)
+            published = format_datetime(now - timedelta(minutes=item_no), usegmt=False)
+            items.append(
+                "<item>"
+                f"<title>{escape(title)}</title>"
+                f"<link>{self.url}/articles/{feed_no}/{item_no}</link>"
+                f"<guid>{self.url}/articles/{feed_no}/{item_no}</guid>"
+                f"<author>reporter{key}@example.com</author>"
+                f"<pubDate>{published}</pubDate>"
+                f"<description>{escape(body)}</description>"
+                "</item>"
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<rss version="2.0"><channel>'
+            f"<title>Bench feed {feed_no}</title><link>{self.url}</link>"
+            f"<description>Synthetic feed</description>{''.join(items)}"
+            "</channel></rss>"
+        ).encode()
+
+    async def handle_feed(self, request):
+        self.requests += 1
+        feed_no = int(request.match_info["n"])
+        if feed_no >= self.feeds:
+            raise web.HTTPNotFound()
+        if feed_no not in self._bodies:
+            self._bodies[feed_no] = self.feed_xml(feed_no)
+        body = self._bodies[feed_no]
+        etag = f'"{self.seed}-{feed_no}-{len(body)}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304)
+        return web.Response(body=body, content_type="application/rss+xml", headers={"ETag": etag})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/feeds/{n}.xml", self.handle_feed)
+        return app
+
+
+def _summary_reply(rng, prompt):
+    topic = next((t for t in TOPICS if t in prompt.lower()), rng.choice(TOPICS))
+    return json.dumps({
+        "summary": [_paragraph(rng, topic, 20), _paragraph(rng, topic, 20)],
+        "author": None,
+        "publish_date": None,
+        "topic": topic,
+    })
+
+
+def _factcheck_reply(rng, prompt):
+    status = rng.choice(["verified", "verified", "disputed", "not_verifiable"])
+    ids = re.findall(r"\[summary_id=(\d+)\]", prompt)
+    if ids:
+        return json.dumps([
+            {"summary_id": int(i), "status": rng.choice(["verified", "disputed"]),
+             "citations": ["https://en.wikipedia.org/wiki/News"]}
+            for i in ids
+        ])
+    return json.dumps({"status": status, "citations": [], "analysis": "Synthetic check."})
+
+
+def _review_reply(rng, prompt):
+    return json.dumps({
+        "status": rng.choice(["verified", "verified", "disputed", "not_verifiable"]),
+        "citations": ["https://en.wikipedia.org/wiki/News"],
+        "commentary": _paragraph(rng, "analysis", 60),
+    })
+
+
+def _default_reply(rng, prompt):
+    return _paragraph(rng, "analysis", 60)
+
+
+class FakeOpenAI(_Server):
+    """
+    ``/v1/chat/completions`` answering after ``latency`` seconds (+-
+    ``jitter``), limited to ``rpm`` requests per minute. Over-limit requests
+    get a 429 like the real API; every response carries the
+    ``x-ratelimit-*`` headers. Replies are chosen by the system prompt via
+    ``responders``.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.05, rpm=3000, seed=0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.rpm = rpm
+        self.bucket = _Bucket(rpm / 60, max(1, rpm / 60))
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        # First matching marker wins
+        self.responders = {
+            "fact-checking and commentary engine": _review_reply,
+            "summarization engine": _summary_reply,
+            "fact-checking engine": _factcheck_reply,
+        }
+
+    def _headers(self, wait=0.0):
+        return {
+            "x-ratelimit-limit-requests": str(self.rpm),
+            "x-ratelimit-remaining-requests": str(int(self.bucket.tokens)),
+            "x-ratelimit-reset-requests": f"{max(wait, 60 / self.rpm):.3f}s",
+            "x-ratelimit-remaining-tokens": "1000000",
+            "x-ratelimit-reset-tokens": "0s",
+        }
+
+    async def handle_completion(self, request):
+        body = await request.json()
+        wait = self.bucket.take()
+        if wait:
+            self.rate_limited += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached for requests", "type": "requests",
+                           "code": "rate_limit_exceeded"}},
+                status=429,
+                headers=self._headers(wait),
+            )
+        self.requests += 1
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+        messages = body.get("messages", [])
+        system = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        prompt = " ".join(str(m.get("content", "")) for m in messages if m.get("role") != "system")
+        responder = next(
+            (fn for marker, fn in self.responders.items() if marker in system),
+            _default_reply,
+        )
+        content = responder(self.rng, prompt)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        return web.json_response(
+            {
+                "id": f"chatcmpl-bench-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(content) // 4,
+                    "total_tokens": prompt_tokens + len(content) // 4,
+                },
+            },
+            headers=self._headers(),
+        )
+
+    def app(self):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self.handle_completion)
+        return app
+
+
+class FakeTelegram(_Server):
+    """
+    Bot API ``sendMessage`` / ``sendPhoto`` enforcing Telegram's flood
+    limits: ``global_rate`` messages per second overall, ``chat_rate`` per
+    second to a private chat and ``group_rate_per_min`` per minute to a
+    group or channel. Violations get a 429 with ``retry_after``.
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, group_rate_per_min=20, latency=0.05):
+        super().__init__()
+        self.global_bucket = _Bucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_min / 60
+        self.latency = latency
+        self.chat_buckets = {}
+        self.delivered = 0
+        self.flood_errors = 0
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = chat_id.startswith("-") or chat_id.startswith("@")
+            bucket = self.chat_buckets[chat_id] = _Bucket(
+                self.group_rate if is_group else self.chat_rate, 1
+            )
+        return bucket
+
+    async def handle_method(self, request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            data = await request.json()
+        else:
+            data = dict(await request.post())
+        if method not in ("sendMessage", "sendPhoto"):
+            return web.json_response({"ok": True, "result": True})
+
+        chat_id = str(data.get("chat_id"))
+        wait = max(self._chat_bucket(chat_id).take(), self.global_bucket.take())
+        if wait:
+            self.flood_errors += 1
+            retry_after = max(1, math.ceil(wait))
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after},
+            }, status=429)
+        await asyncio.sleep(self.latency)
+        self.delivered += 1
+        chat_type = "channel" if chat_id.startswith(("-", "@")) else "private"
+        message = {
+            "message_id": self.delivered,
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else 0, "type": chat_type},
+        }
+        if method == "sendMessage":
+            message["text"] = str(data.get("text", ""))
+        else:
+            message["caption"] = str(data.get("caption", ""))
+        return web.json_response({"ok": True, "result": message})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        return app
@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import math
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"AJBF"
+_HEADER = struct.Struct("<4sBQQQI")  # magic, version, capacity, count, bits, hashes
+_VERSION = 1
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set of strings.
+
+    Membership tests never give false negatives; false positives happen at
+    roughly ``error_rate`` while no more than ``capacity`` items have been
+    added. ``max_bytes`` caps the bit array, trading a higher false-positive
+    rate for a fixed memory budget.
+    """
+
+    def __init__(self, capacity, error_rate=0.001, max_bytes=None):
+        capacity = max(int(capacity), 1)
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        if max_bytes and num_bits > max_bytes * 8:
+            logger.warning(
+                f"Bloom filter for {capacity} items needs {num_bits // 8} bytes; "
+                f"capping at {max_bytes} bytes raises the false-positive rate."
+            )
+            num_bits = max_bytes * 8
+        num_bits = max(num_bits, 8)
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        self._init(capacity, 0, num_bits, num_hashes, bytearray((num_bits + 7) // 8))
+
+    def _init(self, capacity, count, num_bits, num_hashes, bits):
+        self.capacity = capacity
+        self.count = count
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bits
+
+    def _positions(self, item):
+        # Kirsch-Mitzenmacher double hashing over one SHA-256 digest
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1, h2 = struct.unpack_from("<QQ", digest)
+        h2 |= 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item):
+        bits = self.bits
+        for pos in self._positions(item):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    @property
+    def saturated(self):
+        """True once more items were added than the filter was sized for."""
+        return self.count > self.capacity
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def save(self, path):
+        """Write the filter to ``path`` atomically."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(
+                _MAGIC, _VERSION, self.capacity, self.count,
+                self.num_bits, self.num_hashes,
+            ))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a filter written by ``save``. Raises ValueError if the file is invalid."""
+        with open(path, "rb") as f:
+            header = f.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                raise ValueError(f"Truncated bloom filter file: {path}")
+            magic, version, capacity, count, num_bits, num_hashes = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"Not a bloom filter file: {path}")
+            bits = bytearray(f.read())
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError(f"Truncated bloom filter file: {path}")
+        bloom = cls.__new__(cls)
+        bloom._init(capacity, count, num_bits, num_hashes, bits)
+        return bloom
@@ -4,12 +4,186 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DATABASE_URL = os.getenv('DATABASE_URL')
+
+# Connection pool: DB_POOL_SIZE persistent connections plus up to
+# DB_MAX_OVERFLOW extra ones under load; a checkout waits at most
+# DB_POOL_TIMEOUT seconds. Connections are pinged before reuse when
+# DB_POOL_PRE_PING is true and replaced after DB_POOL_RECYCLE seconds.
+# DB_STATEMENT_CACHE_SIZE prepared statements are cached per connection (set
+# 0 behind PgBouncer in transaction pooling mode).
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '100'))
+
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 NEWS_STREAM_CHANNEL_ID = os.getenv('NEWS_STREAM_CHANNEL_ID')
 OUTPUT_DIR = os.getenv('OUTPUT_DIR', 'output')
 PUBLIC_DIR = os.getenv('PUBLIC_DIR', 'public')
 
+# Crawler tuning. Feeds are downloaded concurrently: CRAWL_CONCURRENCY caps the
+# total number of open connections, CRAWL_PER_HOST_LIMIT the connections to a
+# single host, and CRAWL_TIMEOUT (seconds) bounds each feed download. Parsing
+# happens in a thread pool, or in CRAWL_PARSE_PROCESSES worker processes when
+# set to a positive number.
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', '20'))
+CRAWL_PER_HOST_LIMIT = int(os.getenv('CRAWL_PER_HOST_LIMIT', '2'))
+CRAWL_TIMEOUT = float(os.getenv('CRAWL_TIMEOUT', '20'))
+CRAWL_PARSE_PROCESSES = int(os.getenv('CRAWL_PARSE_PROCESSES', '0'))
+
+# Bloom filter of every stored article URL, used by the crawler to skip
+# duplicate work before touching the database. Set SEEN_URL_FILTER_PATH to an
+# empty string to disable it. Positives are confirmed against the database
+# unless SEEN_URL_FILTER_VERIFY is false, in which case roughly
+# SEEN_URL_FILTER_ERROR_RATE of new articles are dropped as false duplicates.
+SEEN_URL_FILTER_PATH = os.getenv('SEEN_URL_FILTER_PATH', os.path.join('data', 'seen_urls.bloom'))
+SEEN_URL_FILTER_ERROR_RATE = float(os.getenv('SEEN_URL_FILTER_ERROR_RATE', '0.001'))
+SEEN_URL_FILTER_MAX_BYTES = int(os.getenv('SEEN_URL_FILTER_MAX_BYTES', str(64 * 1024 * 1024)))
+SEEN_URL_FILTER_VERIFY = os.getenv('SEEN_URL_FILTER_VERIFY', 'true').lower() == 'true'
+
+# SummarizerAgent runs up to SUMMARY_CONCURRENCY OpenAI calls at once and
+# commits finished summaries every SUMMARY_COMMIT_BATCH rows.
+SUMMARY_CONCURRENCY = int(os.getenv('SUMMARY_CONCURRENCY', '8'))
+SUMMARY_COMMIT_BATCH = int(os.getenv('SUMMARY_COMMIT_BATCH', '20'))
+# Upper bound on the article text sent with each summary request
+SUMMARY_MAX_INPUT_TOKENS = int(os.getenv('SUMMARY_MAX_INPUT_TOKENS', '1500'))
+
+# FactCheckAgent packs up to FACTCHECK_BATCH_SIZE summaries (and at most
+# FACTCHECK_BATCH_TOKENS input tokens) into each request. A batch size of 1
+# restores one request per summary.
+FACTCHECK_BATCH_SIZE = int(os.getenv('FACTCHECK_BATCH_SIZE', '10'))
+FACTCHECK_BATCH_TOKENS = int(os.getenv('FACTCHECK_BATCH_TOKENS', '6000'))
+
+# With REVIEW_MERGED true, run_daily fact-checks each summary and writes its
+# commentary in a single OpenAI request (ReviewAgent), REVIEW_CONCURRENCY at a
+# time, instead of running the separate fact-check and commentary stages, and
+# commits the results every REVIEW_COMMIT_BATCH summaries.
+# run_stream always uses the separate stages.
+REVIEW_MERGED = os.getenv('REVIEW_MERGED', 'false').lower() == 'true'
+REVIEW_CONCURRENCY = int(os.getenv('REVIEW_CONCURRENCY', '8'))
+REVIEW_COMMIT_BATCH = int(os.getenv('REVIEW_COMMIT_BATCH', '20'))
+
+# Pipelined daily run (run_daily --pipelined): per-stage worker count and
+# input queue size. A full queue blocks the stage before it, so smaller
+# queues mean tighter backpressure. Override with e.g.
+# PIPELINE_SUMMARIZE_WORKERS=16 or PIPELINE_FACTCHECK_QUEUE=20. Clustering
+# always runs with one worker, since it shares one session.
+def _pipeline_stage(stage, workers, queue_size):
+    prefix = f"PIPELINE_{stage.upper()}_"
+    return {
+        "workers": int(os.getenv(prefix + "WORKERS", str(workers))),
+        "queue_size": int(os.getenv(prefix + "QUEUE", str(queue_size))),
+    }
+
+
+PIPELINE_STAGES = {
+    "cluster": _pipeline_stage("cluster", 1, 200),
+    "summarize": _pipeline_stage("summarize", SUMMARY_CONCURRENCY, 100),
+    "topics": _pipeline_stage("topics", 1, 200),
+    "factcheck": _pipeline_stage("factcheck", 2, 100),
+    "commentary": _pipeline_stage("commentary", 4, 100),
+    "review": _pipeline_stage("review", REVIEW_CONCURRENCY, 100),
+}
+
+# Durable job queue for the summarizer, fact-check and commentary agents. When
+# WORK_QUEUE_ENABLED is true their run() claims jobs from the `jobs` table, so
+# several worker processes can share the load (see `main.py run_worker`).
+# Claimed jobs are leased for WORK_QUEUE_LEASE seconds and retried after
+# WORK_QUEUE_RETRY_DELAY seconds, up to WORK_QUEUE_MAX_ATTEMPTS attempts.
+WORK_QUEUE_ENABLED = os.getenv('WORK_QUEUE_ENABLED', 'false').lower() == 'true'
+WORK_QUEUE_BATCH = int(os.getenv('WORK_QUEUE_BATCH', '10'))
+WORK_QUEUE_LEASE = int(os.getenv('WORK_QUEUE_LEASE', '300'))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv('WORK_QUEUE_MAX_ATTEMPTS', '3'))
+WORK_QUEUE_RETRY_DELAY = int(os.getenv('WORK_QUEUE_RETRY_DELAY', '60'))
+WORK_QUEUE_POLL_INTERVAL = float(os.getenv('WORK_QUEUE_POLL_INTERVAL', '5'))
+
+# Near-duplicate clustering: new articles whose estimated Jaccard similarity
+# with an article fetched in the last CLUSTER_WINDOW_HOURS reaches
+# CLUSTER_SIMILARITY join that article's story and are not summarized again.
+CLUSTER_SIMILARITY = float(os.getenv('CLUSTER_SIMILARITY', '0.5'))
+CLUSTER_WINDOW_HOURS = int(os.getenv('CLUSTER_WINDOW_HOURS', '48'))
+
+# Shared cache of OpenAI responses keyed by a hash of the request. Entries
+# expire after LLM_CACHE_TTL seconds and at most LLM_CACHE_MAX_ENTRIES are kept
+# (least recently used are evicted every LLM_CACHE_PRUNE_EVERY writes). Lookups
+# are plain reads; an entry's last_used_at (and hit count) is only written back
+# once it is more than LLM_CACHE_TOUCH_INTERVAL seconds stale.
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '50000'))
+LLM_CACHE_PRUNE_EVERY = int(os.getenv('LLM_CACHE_PRUNE_EVERY', '100'))
+LLM_CACHE_TOUCH_INTERVAL = int(os.getenv('LLM_CACHE_TOUCH_INTERVAL', '3600'))
+
+# Telegram delivery. Outgoing digests and stream posts are queued in the
+# `outbox` table and sent by DELIVERY_WORKERS concurrent senders, throttled to
+# TELEGRAM_GLOBAL_RATE messages per second overall, TELEGRAM_CHAT_RATE per
+# second to a private chat and TELEGRAM_GROUP_RATE_PER_MIN per minute to a
+# group or channel. A message is given up after DELIVERY_MAX_ATTEMPTS failed
+# sends; claimed messages are re-sent by a later run if not confirmed within
+# DELIVERY_LEASE seconds.
+DELIVERY_WORKERS = int(os.getenv('DELIVERY_WORKERS', '16'))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv('DELIVERY_MAX_ATTEMPTS', '5'))
+DELIVERY_LEASE = int(os.getenv('DELIVERY_LEASE', '300'))
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_GROUP_RATE_PER_MIN = float(os.getenv('TELEGRAM_GROUP_RATE_PER_MIN', '20'))
+
+# Rendered digests are shared by every subscriber with the same topic,
+# frequency and summaries; at most DIGEST_CACHE_MAX_BYTES of them are kept.
+DIGEST_CACHE_MAX_BYTES = int(os.getenv('DIGEST_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+# FormatterAgent streams issue items from the database FORMATTER_YIELD_PER
+# rows at a time instead of loading the whole day. Compiled templates are
+# cached in FORMATTER_BYTECODE_CACHE_DIR (empty to disable). Rendered item
+# fragments are kept in memory, up to FORMATTER_FRAGMENT_CACHE_MAX_BYTES, and
+# on disk in FORMATTER_FRAGMENT_CACHE_DIR (empty to disable) so later runs
+# re-render only changed items; files unused for FORMATTER_FRAGMENT_CACHE_DAYS
+# are deleted.
+FORMATTER_YIELD_PER = int(os.getenv('FORMATTER_YIELD_PER', '100'))
+FORMATTER_BYTECODE_CACHE_DIR = os.getenv('FORMATTER_BYTECODE_CACHE_DIR', os.path.join('data', 'jinja_cache'))
+FORMATTER_FRAGMENT_CACHE_MAX_BYTES = int(os.getenv('FORMATTER_FRAGMENT_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+FORMATTER_FRAGMENT_CACHE_DIR = os.getenv('FORMATTER_FRAGMENT_CACHE_DIR', os.path.join('data', 'fragment_cache'))
+FORMATTER_FRAGMENT_CACHE_DAYS = float(os.getenv('FORMATTER_FRAGMENT_CACHE_DAYS', '7'))
+
+# Instrumentation. While a command runs, /metrics (Prometheus text) and
+# /report (JSON) are served on METRICS_PORT when it is non-zero. JSON run
+# reports and --profile output are written to METRICS_REPORT_DIR.
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_REPORT_DIR = os.getenv('METRICS_REPORT_DIR', os.path.join('output', 'reports'))
+
+# Stream daemon (run_stream --daemon). Each feed is polled on its own
+# interval between STREAM_POLL_MIN and STREAM_POLL_MAX seconds, starting at
+# STREAM_POLL_DEFAULT: it tightens towards half the feed's average gap
+# between new entries and grows by STREAM_POLL_BACKOFF after every poll that
+# found nothing. The clustering window is reloaded every
+# STREAM_CLUSTER_RELOAD seconds.
+STREAM_POLL_MIN = float(os.getenv('STREAM_POLL_MIN', '60'))
+STREAM_POLL_MAX = float(os.getenv('STREAM_POLL_MAX', '3600'))
+STREAM_POLL_DEFAULT = float(os.getenv('STREAM_POLL_DEFAULT', '300'))
+STREAM_POLL_BACKOFF = float(os.getenv('STREAM_POLL_BACKOFF', '1.5'))
+STREAM_CLUSTER_RELOAD = float(os.getenv('STREAM_CLUSTER_RELOAD', '1800'))
+
+# TopicAgent tags summaries in batches of TOPIC_BATCH_SIZE and re-reads the
+# topics users subscribed to every TOPIC_VOCABULARY_TTL seconds.
+TOPIC_BATCH_SIZE = int(os.getenv('TOPIC_BATCH_SIZE', '200'))
+TOPIC_VOCABULARY_TTL = float(os.getenv('TOPIC_VOCABULARY_TTL', '600'))
+
+# PublisherAgent matches preferences to summaries by embedding similarity
+# when EMBEDDING_MATCH_ENABLED is true (otherwise by exact topic tag).
+# Verified summaries from the last EMBEDDING_WINDOW_DAYS are embedded once and
+# kept as float16 arrays in EMBEDDING_INDEX_DIR; matches scoring below
+# EMBEDDING_MIN_SCORE are dropped. EMBEDDING_MODEL names a local
+# sentence-transformers model; empty uses hashed EMBEDDING_DIM-d vectors.
+EMBEDDING_MATCH_ENABLED = os.getenv('EMBEDDING_MATCH_ENABLED', 'true').lower() == 'true'
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', '')
+EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', '512'))
+EMBEDDING_INDEX_DIR = os.getenv('EMBEDDING_INDEX_DIR', os.path.join('data', 'embeddings'))
+EMBEDDING_WINDOW_DAYS = int(os.getenv('EMBEDDING_WINDOW_DAYS', '7'))
+EMBEDDING_MIN_SCORE = float(os.getenv('EMBEDDING_MIN_SCORE', '0.15'))
+
 # Optional additional sources can be provided via the EXTRA_SOURCES environment
 # variable. The format is a semicolon separated list of
 # "name|url|is_social" items, for example:
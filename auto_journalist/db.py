@@ -1,13 +1,148 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from .config import DATABASE_URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from .config import (
+    DATABASE_URL,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE,
+)
+from .metrics import instrument_engine, instrument_pool, metrics
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - start)
+
+
+def _engine_url(url):
+    url = make_url(url.replace('postgresql://', 'postgresql+asyncpg://'))
+    # SQLAlchemy's own prepared statement cache in the asyncpg dialect
+    return url.update_query_dict(
+        {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+    )
+
 
 engine = create_async_engine(
-    DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://'),
-    echo=False
+    _engine_url(DATABASE_URL),
+    echo=False,
+    poolclass=TimedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
 )
+instrument_engine(engine)
+instrument_pool(engine)
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+logger = logging.getLogger(__name__)
+
+# (session, owning task) while a run_session() scope is open
+_run_session = ContextVar("run_session", default=None)
+
+
+@asynccontextmanager
+async def run_session():
+    """
+    Share one session, and so one pooled connection, between the
+    ``get_session()`` calls the current task makes until the block exits,
+    instead of checking out a connection per call. Tasks started inside the
+    block (pipeline workers, gathered calls) still get sessions of their own,
+    since a session must not be used concurrently. Call ``end_stage()``
+    between stages so each one runs in a transaction of its own.
+    """
+    session = _shared_session()
+    if session is not None:
+        yield session
+        return
+    # Bound to one connection, the session keeps it across commits
+    async with engine.connect() as connection:
+        async with AsyncSessionLocal(bind=connection) as session:
+            _track_writes(session)
+            token = _run_session.set((session, asyncio.current_task()))
+            try:
+                yield session
+            finally:
+                _run_session.reset(token)
+
+
+def _shared_session():
+    """The run's shared session, if the current task opened one."""
+    scope = _run_session.get()
+    if scope is not None and scope[1] is asyncio.current_task():
+        return scope[0]
+    return None
+
+
+def _track_writes(session):
+    """
+    Flag Core INSERT/UPDATE/DELETE statements run through ``session`` until
+    the transaction ends; unlike ORM changes they leave no trace in
+    ``session.new``/``dirty``/``deleted``.
+    """
+    sync_session = session.sync_session
+
+    @event.listens_for(sync_session, "do_orm_execute")
+    def _flag_write(state):
+        if state.is_insert or state.is_update or state.is_delete:
+            sync_session.info["uncommitted_writes"] = True
+
+    @event.listens_for(sync_session, "after_commit")
+    @event.listens_for(sync_session, "after_rollback")
+    def _clear(_):
+        sync_session.info.pop("uncommitted_writes", None)
+
+
+async def end_stage(failed=False):
+    """
+    End a stage on the run's shared session, so the next stage starts as
+    from a fresh session: whatever the stage left uncommitted is rolled
+    back, as closing a session of its own would have done, and the
+    identity map is emptied. A no-op outside ``run_session()``.
+    """
+    session = _shared_session()
+    if session is None:
+        return
+    if session.in_transaction():
+        if not failed and (
+            session.new or session.dirty or session.deleted
+            or session.sync_session.info.get("uncommitted_writes")
+        ):
+            logger.warning("Rolling back uncommitted writes left by the stage")
+        await session.rollback()
+    session.expunge_all()
+
 
-async def get_session():
+async def get_session(shared=True):
+    """
+    Yield a session: the run's shared one inside ``run_session()`` (unless
+    ``shared`` is False, for work that must commit independently of the
+    caller's transaction), otherwise a fresh one. The shared session is
+    handed out as is, so nested calls don't disturb an outer caller's
+    objects; ``end_stage()`` resets it between stages.
+    """
+    session = _shared_session() if shared else None
+    if session is not None:
+        yield session
+        return
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
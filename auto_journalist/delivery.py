@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from .config import (
+    DELIVERY_LEASE,
+    DELIVERY_MAX_ATTEMPTS,
+    DELIVERY_WORKERS,
+    TELEGRAM_CHAT_RATE,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_GROUP_RATE_PER_MIN,
+)
+from .db import get_session
+from .metrics import metrics
+from .models import OutboxMessage, OutboxStatusEnum
+
+
+class TokenBucket:
+    """Allow ``rate`` acquisitions per second, in bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def block(self, seconds):
+        """Hand out no tokens for the next ``seconds`` (e.g. a flood wait)."""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        # The lock queues waiters in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _retry_after_seconds(error):
+    # int in python-telegram-bot 20, timedelta in later releases
+    delay = error.retry_after
+    return delay.total_seconds() if isinstance(delay, timedelta) else float(delay)
+
+
+def _is_group(chat_id):
+    # Groups and channels have negative ids or @usernames
+    return chat_id.startswith("-") or chat_id.startswith("@")
+
+
+class TelegramOutbox:
+    """
+    Durable, rate-limited Telegram delivery through the ``outbox`` table.
+
+    Agents queue ``OutboxMessage`` rows in the same transaction as their own
+    bookkeeping and then call ``deliver``, which sends every pending message
+    with ``workers`` concurrent senders. Sends are throttled by a global
+    token bucket and one bucket per chat, and a ``RetryAfter`` from Telegram
+    pauses the affected chat for the requested time. Delivery is
+    at-least-once: messages are claimed with ``FOR UPDATE SKIP LOCKED`` and
+    leased for ``lease`` seconds, so messages left over by a crashed or
+    interrupted run are sent by the next one.
+    """
+
+    def __init__(self, bot, workers=DELIVERY_WORKERS, max_attempts=DELIVERY_MAX_ATTEMPTS,
+                 lease=DELIVERY_LEASE, global_rate=TELEGRAM_GLOBAL_RATE,
+                 chat_rate=TELEGRAM_CHAT_RATE, group_rate_per_min=TELEGRAM_GROUP_RATE_PER_MIN):
+        self.bot = bot
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_min / 60
+        self.global_bucket = TokenBucket(global_rate, capacity=max(1, int(global_rate)))
+        self.chat_buckets = {}
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "flood_waits": 0}
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+    @staticmethod
+    def message(chat_id, text, photo_url=None, parse_mode=ParseMode.MARKDOWN):
+        """Build an outbox row; the caller adds it to its session and commits."""
+        return OutboxMessage(
+            chat_id=str(chat_id),
+            text=text,
+            photo_url=photo_url,
+            parse_mode=parse_mode,
+            status=OutboxStatusEnum.PENDING,
+            attempts=0,
+        )
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = self.group_rate if _is_group(chat_id) else self.chat_rate
+            bucket = self.chat_buckets[chat_id] = TokenBucket(rate)
+        return bucket
+
+    def _per_chat_limit(self, rate):
+        # What one chat's bucket can send in half the lease, so a claimed
+        # batch is drained well before another process may re-claim it
+        return max(1, int(rate * self.lease / 2))
+
+    async def claim(self, limit):
+        """
+        Lease up to ``limit`` due messages, oldest first, and no more for any
+        one chat than its rate limit lets us send before the lease expires.
+        """
+        now = datetime.utcnow()
+        chat_limit = sa.case(
+            (
+                OutboxMessage.chat_id.startswith("-") | OutboxMessage.chat_id.startswith("@"),
+                self._per_chat_limit(self.group_rate),
+            ),
+            else_=self._per_chat_limit(self.chat_rate),
+        )
+        # Rank each chat's pending messages, those still leased to a claim
+        # (ours or another process's) first, so they count against its share
+        is_due = OutboxMessage.not_before <= now
+        ranked = (
+            sa.select(
+                OutboxMessage.id,
+                is_due.label("due"),
+                sa.func.row_number().over(
+                    partition_by=OutboxMessage.chat_id, order_by=(is_due, OutboxMessage.id)
+                ).label("rank"),
+                chat_limit.label("chat_limit"),
+            )
+            .where(OutboxMessage.status == OutboxStatusEnum.PENDING)
+            .subquery()
+        )
+        # FOR UPDATE can't be combined with a window function in the same query
+        available = (
+            sa.select(OutboxMessage.id)
+            .where(
+                OutboxMessage.id.in_(
+                    sa.select(ranked.c.id).where(ranked.c.due, ranked.c.rank <= ranked.c.chat_limit)
+                ),
+                OutboxMessage.status == OutboxStatusEnum.PENDING,
+                OutboxMessage.not_before <= now,
+            )
+            .order_by(OutboxMessage.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            sa.update(OutboxMessage)
+            .where(OutboxMessage.id.in_(available))
+            .values(not_before=now + timedelta(seconds=self.lease))
+            .returning(
+                OutboxMessage.id,
+                OutboxMessage.chat_id,
+                OutboxMessage.text,
+                OutboxMessage.photo_url,
+                OutboxMessage.parse_mode,
+                OutboxMessage.attempts,
+            )
+        )
+        expires = time.monotonic() + self.lease
+        async for session in get_session():
+            rows = (await session.execute(stmt)).mappings().all()
+            await session.commit()
+            return sorted(
+                (dict(row, lease_expires=expires) for row in rows), key=lambda row: row["id"]
+            )
+
+    async def _send(self, msg):
+        chat_id = msg["chat_id"]
+        if chat_id.lstrip("-").isdigit():
+            chat_id = int(chat_id)
+        if msg["photo_url"]:
+            await self.bot.send_photo(
+                chat_id=chat_id,
+                photo=msg["photo_url"],
+                caption=msg["text"],
+                parse_mode=msg["parse_mode"],
+            )
+        else:
+            await self.bot.send_message(
+                chat_id=chat_id,
+                text=msg["text"],
+                parse_mode=msg["parse_mode"],
+            )
+
+    async def _deliver_one(self, msg):
+        """
+        Send one message, retrying transient errors. Returns its outbox
+        update, or None if the lease ran out first and the message was left
+        for the next claim.
+        """
+        chat_bucket = self._chat_bucket(msg["chat_id"])
+        attempts = msg["attempts"]
+        backoff = 1
+        while True:
+            await chat_bucket.acquire()
+            await self.global_bucket.acquire()
+            if time.monotonic() >= msg["lease_expires"]:
+                # Long flood waits can outlast the lease; another process may
+                # own the message now, so sending it could duplicate it
+                self.logger.warning(f"Lease on outbox message {msg['id']} expired before sending")
+                metrics.inc("telegram_lease_expired_total")
+                return None
+            try:
+                with metrics.timer("telegram_send_seconds"):
+                    await self._send(msg)
+            except RetryAfter as e:
+                # Flood control is not the message's fault; don't count an attempt
+                delay = _retry_after_seconds(e)
+                self.stats["flood_waits"] += 1
+                metrics.inc("telegram_flood_waits_total")
+                self.logger.warning(f"Flood wait of {delay:.0f}s for chat {msg['chat_id']}")
+                chat_bucket.block(delay)
+                continue
+            except (BadRequest, Forbidden) as e:
+                # Malformed message or the user blocked the bot; retrying won't help
+                return self._failed(msg, attempts + 1, e)
+            except NetworkError as e:
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    return self._failed(msg, attempts, e)
+                self.stats["retried"] += 1
+                await asyncio.sleep(backoff)
+                backoff *= 2
+                continue
+            except TelegramError as e:
+                return self._failed(msg, attempts + 1, e)
+            self.stats["sent"] += 1
+            metrics.inc("telegram_messages_total", status="sent")
+            return {
+                "id": msg["id"],
+                "status": OutboxStatusEnum.SENT,
+                "attempts": attempts + 1,
+                "sent_at": datetime.utcnow(),
+                "last_error": None,
+            }
+
+    def _failed(self, msg, attempts, error):
+        self.stats["failed"] += 1
+        metrics.inc("telegram_messages_total", status="failed")
+        self.logger.error(f"Giving up on outbox message {msg['id']} to {msg['chat_id']}: {error!r}")
+        return {
+            "id": msg["id"],
+            "status": OutboxStatusEnum.FAILED,
+            "attempts": attempts,
+            "last_error": repr(error),
+        }
+
+    async def _record(self, updates):
+        async for session in get_session():
+            await session.execute(sa.update(OutboxMessage), updates)
+            await session.commit()
+
+    async def deliver(self):
+        """Send every pending outbox message; returns the delivery stats."""
+        started = time.monotonic()
+        self.stats = dict.fromkeys(self.stats, 0)
+        while True:
+            batch = await self.claim(self.workers * 10)
+            if not batch:
+                break
+            queue = asyncio.Queue()
+            for msg in batch:
+                queue.put_nowait(msg)
+            updates = []
+
+            async def worker():
+                while not queue.empty():
+                    update = await self._deliver_one(queue.get_nowait())
+                    if update is not None:
+                        updates.append(update)
+
+            await asyncio.gather(*(worker() for _ in range(min(self.workers, len(batch)))))
+            if updates:
+                await self._record(updates)
+
+        elapsed = time.monotonic() - started
+        if self.stats["sent"] or self.stats["failed"]:
+            self.logger.info(
+                f"Delivered {self.stats['sent']} messages in {elapsed:.1f}s "
+                f"({self.stats['sent'] / elapsed:.1f} msg/s); "
+                f"{self.stats['failed']} failed, {self.stats['retried']} retried, "
+                f"{self.stats['flood_waits']} flood waits"
+            )
+        return self.stats
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import logging
+import math
+import os
+from collections import Counter
+
+import numpy as np
+
+from .config import EMBEDDING_DIM, EMBEDDING_INDEX_DIR, EMBEDDING_MODEL
+from .topics import normalize_topic
+
+try:  # optional dependency: neural sentence embeddings on CPU
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # pragma: no cover - depends on installed extras
+    SentenceTransformer = None
+
+logger = logging.getLogger(__name__)
+
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were will with".split()
+)
+
+
+class HashingEmbedder:
+    """
+    Dependency-free text embeddings: signed feature hashing of word unigrams
+    and bigrams with sublinear term frequencies, L2-normalized. Lexical
+    rather than semantic, but "EU energy" still lands near summaries about
+    energy in the EU without any model download.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text):
+        words = [w for w in normalize_topic(text).split() if w not in _STOP_WORDS]
+        return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                sign = 1.0 if h >> 63 else -1.0
+                vectors[row, h % self.dim] += sign * (1 + math.log(count))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    """Embeddings from a local sentence-transformers model, run on CPU."""
+
+    def __init__(self, model_name):
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts):
+        return self.model.encode(
+            list(texts), batch_size=64, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32)
+
+
+def get_embedder(model_name=EMBEDDING_MODEL):
+    """The configured embedder, falling back to feature hashing."""
+    if model_name:
+        if SentenceTransformer is not None:
+            return SentenceTransformerEmbedder(model_name)
+        logger.warning(
+            f"EMBEDDING_MODEL={model_name} needs sentence-transformers; using hashed embeddings"
+        )
+    return HashingEmbedder()
+
+
+class EmbeddingIndex:
+    """
+    Flat index of unit-length summary embeddings, stored as float16 NumPy
+    files under ``directory`` and memory-mapped when loaded. Rows are kept
+    sorted by summary id; each summary is embedded once, the first time it
+    is synced into the index.
+    """
+
+    def __init__(self, directory=EMBEDDING_INDEX_DIR, embedder=None):
+        self.directory = directory
+        self.embedder = embedder or get_embedder()
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, self.embedder.dim), dtype=np.float16)
+        self._loaded = False
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        """Map the saved index, unless it was built by a different embedder."""
+        self._loaded = True
+        try:
+            with open(self._path("meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        if meta.get("embedder") != self.embedder.name or meta.get("dim") != self.embedder.dim:
+            logger.info(f"Embedding index was built with {meta.get('embedder')}; rebuilding")
+            return
+        self.ids = np.load(self._path("ids.npy"))
+        self.vectors = np.load(self._path("vectors.f16.npy"), mmap_mode="r")
+
+    def _save(self, ids, vectors):
+        os.makedirs(self.directory, exist_ok=True)
+        for name, array in (("ids.npy", ids), ("vectors.f16.npy", vectors)):
+            tmp = self._path(name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, self._path(name))
+        with open(self._path("meta.json"), "w") as f:
+            json.dump({"embedder": self.embedder.name, "dim": self.embedder.dim}, f)
+        self.ids = ids
+        self.vectors = np.load(self._path("vectors.f16.npy"), mmap_mode="r")
+
+    def sync(self, rows):
+        """
+        Make the index hold exactly ``rows`` (``(summary_id, text)`` pairs),
+        embedding only the summaries it has not seen. Returns the number of
+        new embeddings.
+        """
+        if not self._loaded:
+            self.load()
+        wanted = np.array(sorted({summary_id for summary_id, _ in rows}), dtype=np.int64)
+        keep = np.isin(self.ids, wanted)
+        known = set(self.ids[keep].tolist())
+        new = {summary_id: text for summary_id, text in rows if summary_id not in known}
+        if not new and keep.all():
+            return 0
+        new_ids = np.array(sorted(new), dtype=np.int64)
+        new_vectors = (
+            self.embedder.embed([new[i] or "" for i in new_ids.tolist()]).astype(np.float16)
+            if len(new_ids) else np.empty((0, self.embedder.dim), dtype=np.float16)
+        )
+        ids = np.concatenate([self.ids[keep], new_ids])
+        vectors = np.concatenate([np.asarray(self.vectors[keep]), new_vectors])
+        order = np.argsort(ids, kind="stable")
+        self._save(ids[order], vectors[order])
+        return len(new_ids)
+
+    def search(self, queries, k, min_score=0.0):
+        """
+        Top ``k`` ``(summary_id, score)`` pairs for each row of ``queries``
+        (unit vectors), best first, from one matrix multiply over the index.
+        """
+        if not len(self.ids) or not len(queries):
+            return [[] for _ in range(len(queries))]
+        scores = np.asarray(queries, dtype=np.float32) @ np.asarray(self.vectors, dtype=np.float32).T
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, columns in enumerate(top):
+            columns = columns[np.argsort(-scores[row, columns])]
+            results.append([
+                (int(self.ids[c]), float(scores[row, c]))
+                for c in columns if scores[row, c] >= min_score
+            ])
+        return results
@@ -0,0 +1,137 @@
+import random
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .config import (
+    STREAM_POLL_BACKOFF,
+    STREAM_POLL_DEFAULT,
+    STREAM_POLL_MAX,
+    STREAM_POLL_MIN,
+)
+from .models import FeedCache
+
+# Weight of the latest gap in the moving average of gaps between entries
+GAP_SMOOTHING = 0.3
+# Polls per expected new entry once a feed's publishing rate is known
+POLLS_PER_ENTRY = 2
+
+
+class FeedScheduler:
+    """
+    Per-feed adaptive polling schedule, persisted in ``feed_cache``.
+
+    A feed that keeps publishing is polled about ``POLLS_PER_ENTRY`` times
+    per average gap between its new entries; every poll that finds nothing
+    stretches its interval by ``backoff``. Intervals stay between
+    ``min_interval`` and ``max_interval`` seconds.
+    """
+
+    def __init__(self, min_interval=STREAM_POLL_MIN, max_interval=STREAM_POLL_MAX,
+                 default_interval=STREAM_POLL_DEFAULT, backoff=STREAM_POLL_BACKOFF):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.backoff = backoff
+        self.feeds = {}
+        self._dirty = set()
+
+    def _clamp(self, interval):
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    async def load(self, session, sources):
+        """Track ``sources``, restoring the saved schedule of known feeds."""
+        sources = {src["url"]: src for src in sources}
+        new_urls = sources.keys() - self.feeds.keys()
+        for url in self.feeds.keys() - sources.keys():
+            del self.feeds[url]
+        if not new_urls:
+            return
+        rows = (await session.execute(
+            sa.select(
+                FeedCache.url, FeedCache.poll_interval, FeedCache.next_poll_at,
+                FeedCache.last_new_at, FeedCache.mean_gap,
+            ).where(FeedCache.url.in_(new_urls))
+        )).all()
+        saved = {row.url: row for row in rows}
+        now = datetime.utcnow()
+        for url in new_urls:
+            row = saved.get(url)
+            self.feeds[url] = {
+                "source": sources[url],
+                "interval": row.poll_interval if row and row.poll_interval else self.default_interval,
+                # Spread never-polled feeds over the first minimum interval
+                "next_poll_at": (
+                    row.next_poll_at if row and row.next_poll_at
+                    else now + timedelta(seconds=random.uniform(0, self.min_interval))
+                ),
+                "last_new_at": row.last_new_at if row else None,
+                "mean_gap": row.mean_gap if row else None,
+            }
+
+    def due(self, now=None):
+        """Sources whose next poll time has come."""
+        now = now or datetime.utcnow()
+        return [feed["source"] for feed in self.feeds.values() if feed["next_poll_at"] <= now]
+
+    def seconds_until_next(self, now=None):
+        if not self.feeds:
+            return self.min_interval
+        now = now or datetime.utcnow()
+        next_poll = min(feed["next_poll_at"] for feed in self.feeds.values())
+        return max(0.0, (next_poll - now).total_seconds())
+
+    def record(self, url, new_entries, now=None):
+        """Reschedule ``url`` after a poll that found ``new_entries`` entries."""
+        feed = self.feeds.get(url)
+        if feed is None:
+            return
+        now = now or datetime.utcnow()
+        if new_entries:
+            if feed["last_new_at"] is not None:
+                gap = (now - feed["last_new_at"]).total_seconds() / new_entries
+                feed["mean_gap"] = (
+                    gap if feed["mean_gap"] is None
+                    else GAP_SMOOTHING * gap + (1 - GAP_SMOOTHING) * feed["mean_gap"]
+                )
+            feed["last_new_at"] = now
+            if feed["mean_gap"] is not None:
+                interval = feed["mean_gap"] / POLLS_PER_ENTRY
+            else:
+                interval = feed["interval"] / 2
+        else:
+            interval = feed["interval"] * self.backoff
+        feed["interval"] = self._clamp(interval)
+        feed["next_poll_at"] = now + timedelta(seconds=feed["interval"])
+        self._dirty.add(url)
+
+    async def save(self, session):
+        """Persist schedules changed since the last save (not committed)."""
+        if not self._dirty:
+            return
+        rows = [
+            {
+                "url": url,
+                "poll_interval": self.feeds[url]["interval"],
+                "next_poll_at": self.feeds[url]["next_poll_at"],
+                "last_new_at": self.feeds[url]["last_new_at"],
+                "mean_gap": self.feeds[url]["mean_gap"],
+                "checked_at": datetime.utcnow(),
+                "content_length": 0,
+            }
+            for url in self._dirty if url in self.feeds
+        ]
+        self._dirty.clear()
+        if not rows:
+            return
+        stmt = pg_insert(FeedCache).values(rows)
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["url"],
+                set_={
+                    column: stmt.excluded[column]
+                    for column in ("poll_interval", "next_poll_at", "last_new_at", "mean_gap")
+                },
+            )
+        )
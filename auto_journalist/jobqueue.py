@@ -0,0 +1,213 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from .config import (
+    WORK_QUEUE_BATCH,
+    WORK_QUEUE_LEASE,
+    WORK_QUEUE_MAX_ATTEMPTS,
+    WORK_QUEUE_POLL_INTERVAL,
+    WORK_QUEUE_RETRY_DELAY,
+)
+from .db import get_session
+from .models import Job, JobStatusEnum
+
+
+class JobQueue:
+    """
+    Durable per-kind work queue in the ``jobs`` table.
+
+    Any number of processes may call ``work`` for the same kind: jobs are
+    claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` and leased for
+    ``lease`` seconds, so each item is processed by one worker at a time.
+    A worker that dies simply lets its lease expire. Failed jobs are retried
+    after ``retry_delay`` seconds until ``max_attempts`` is reached, then
+    dead-lettered with status ``dead``.
+    """
+
+    def __init__(self, kind, lease=WORK_QUEUE_LEASE, max_attempts=WORK_QUEUE_MAX_ATTEMPTS,
+                 retry_delay=WORK_QUEUE_RETRY_DELAY):
+        self.kind = kind
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.logger = logging.getLogger(f"{__name__}.{kind}")
+
+    async def enqueue_pending(self, pending_ids):
+        """
+        Queue every item id selected by ``pending_ids`` (typically an
+        anti-join for rows with no output yet) that has no job. Safe to run
+        from several workers at once.
+        """
+        ids = pending_ids.subquery()
+        now = datetime.utcnow()
+        select_jobs = sa.select(
+            sa.literal(self.kind),
+            ids.c[0],
+            sa.literal(JobStatusEnum.PENDING, Job.status.type),
+            sa.literal(0),
+            sa.literal(self.max_attempts),
+            sa.literal(now),
+            sa.literal(now),
+        )
+        stmt = (
+            pg_insert(Job)
+            .from_select(
+                ["kind", "item_id", "status", "attempts", "max_attempts",
+                 "created_at", "updated_at"],
+                select_jobs,
+            )
+            .on_conflict_do_nothing(index_elements=["kind", "item_id"])
+        )
+        async for session in get_session():
+            result = await session.execute(stmt)
+            await session.commit()
+            return result.rowcount
+
+    async def claim(self, limit):
+        """Lease up to ``limit`` available jobs; returns ``{job_id: item_id}``."""
+        now = datetime.utcnow()
+        available = (
+            sa.select(Job.id)
+            .where(
+                Job.kind == self.kind,
+                Job.attempts < Job.max_attempts,
+                sa.or_(
+                    sa.and_(
+                        Job.status == JobStatusEnum.PENDING,
+                        sa.or_(Job.lease_until.is_(None), Job.lease_until <= now),
+                    ),
+                    # Lease of a crashed worker ran out
+                    sa.and_(Job.status == JobStatusEnum.RUNNING, Job.lease_until <= now),
+                ),
+            )
+            .order_by(Job.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            sa.update(Job)
+            .where(Job.id.in_(available))
+            .values(
+                status=JobStatusEnum.RUNNING,
+                attempts=Job.attempts + 1,
+                lease_until=now + timedelta(seconds=self.lease),
+                updated_at=now,
+            )
+            .returning(Job.id, Job.item_id)
+        )
+        async for session in get_session():
+            rows = (await session.execute(stmt)).all()
+            await session.commit()
+            return dict(rows)
+
+    async def complete(self, job_ids):
+        if not job_ids:
+            return
+        async for session in get_session():
+            await session.execute(
+                sa.update(Job)
+                .where(Job.id.in_(job_ids))
+                .values(status=JobStatusEnum.DONE, lease_until=None,
+                        updated_at=datetime.utcnow())
+            )
+            await session.commit()
+
+    async def fail(self, job_ids, error):
+        """Schedule a retry, or dead-letter jobs that used all their attempts."""
+        if not job_ids:
+            return
+        now = datetime.utcnow()
+        retry_at = now + timedelta(seconds=self.retry_delay)
+        async for session in get_session():
+            await session.execute(
+                sa.update(Job)
+                .where(Job.id.in_(job_ids))
+                .values(
+                    status=sa.case(
+                        (
+                            Job.attempts >= Job.max_attempts,
+                            sa.literal(JobStatusEnum.DEAD, Job.status.type),
+                        ),
+                        else_=sa.literal(JobStatusEnum.PENDING, Job.status.type),
+                    ),
+                    lease_until=retry_at,
+                    last_error=error,
+                    updated_at=now,
+                )
+            )
+            await session.commit()
+
+    async def reap(self):
+        """Dead-letter jobs whose last lease expired with no attempts left."""
+        async for session in get_session():
+            result = await session.execute(
+                sa.update(Job)
+                .where(
+                    Job.kind == self.kind,
+                    Job.status == JobStatusEnum.RUNNING,
+                    Job.lease_until <= datetime.utcnow(),
+                    Job.attempts >= Job.max_attempts,
+                )
+                .values(status=JobStatusEnum.DEAD, last_error="lease expired")
+            )
+            await session.commit()
+            return result.rowcount
+
+    async def _run_jobs(self, jobs, handler, batched):
+        if batched:
+            try:
+                done_items = set(await handler(list(jobs.values())))
+                error = "no result"
+            except Exception as e:
+                self.logger.exception(f"{self.kind} batch failed")
+                done_items, error = set(), repr(e)
+            done = [job_id for job_id, item_id in jobs.items() if item_id in done_items]
+            await self.complete(done)
+            await self.fail([job_id for job_id in jobs if job_id not in done], error)
+            return
+
+        async def run_one(job_id, item_id):
+            try:
+                if await handler(item_id):
+                    await self.complete([job_id])
+                else:
+                    await self.fail([job_id], "no result")
+            except Exception as e:
+                self.logger.exception(f"{self.kind} job {job_id} failed")
+                await self.fail([job_id], repr(e))
+
+        await asyncio.gather(*(run_one(*job) for job in jobs.items()))
+
+    async def work(self, handler, pending_ids, batch=WORK_QUEUE_BATCH, batched=False,
+                   forever=False, poll_interval=WORK_QUEUE_POLL_INTERVAL):
+        """
+        Enqueue pending items, then claim and process jobs ``batch`` at a
+        time until none are left; with ``forever``, repeat every
+        ``poll_interval`` seconds.
+
+        ``handler`` receives one item id and returns a truthy result on
+        success, or, when ``batched``, a list of item ids and returns the ids
+        it completed. Returns once the queue is empty unless ``forever``.
+        """
+        processed = 0
+        while True:
+            # New items and expired leases are picked up once per pass over
+            # the queue, not before every claim
+            await self.enqueue_pending(pending_ids)
+            await self.reap()
+            while True:
+                jobs = await self.claim(batch)
+                if not jobs:
+                    break
+                await self._run_jobs(jobs, handler, batched)
+                processed += len(jobs)
+            if not forever:
+                break
+            await asyncio.sleep(poll_interval)
+        self.logger.info(f"Processed {processed} {self.kind} jobs")
+        return processed
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from .config import (
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_PRUNE_EVERY,
+    LLM_CACHE_TOUCH_INTERVAL,
+)
+from .db import get_session
+from .models import LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(params):
+    """Hash of the request parameters (model, messages, sampling options)."""
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Content-addressed store of OpenAI responses shared by all agents.
+
+    Entries expire after ``ttl`` seconds; once more than ``max_entries`` are
+    stored, the least recently used ones are evicted. Lookups only read; hits
+    are counted in memory and written back together with ``last_used_at``
+    once the entry's timestamp is more than ``touch_interval`` seconds old,
+    which is plenty of resolution for LRU eviction. Database errors are
+    logged and treated as cache misses so the cache can never break a call.
+    """
+
+    def __init__(self, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 prune_every=LLM_CACHE_PRUNE_EVERY,
+                 touch_interval=LLM_CACHE_TOUCH_INTERVAL):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self.touch_interval = touch_interval
+        self.stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._writes = 0
+        self._pending_hits = defaultdict(int)
+
+    def hit_rate(self, agent):
+        stats = self.stats[agent]
+        total = stats["hits"] + stats["misses"]
+        return stats["hits"] / total if total else 0.0
+
+    async def get(self, key, agent):
+        """Return the cached response dict for ``key``, or None."""
+        now = datetime.utcnow()
+        response = None
+        try:
+            async for session in get_session(shared=False):
+                stmt = sa.select(LLMCacheEntry.response, LLMCacheEntry.last_used_at).where(
+                    LLMCacheEntry.key == key,
+                    LLMCacheEntry.created_at > now - timedelta(seconds=self.ttl),
+                )
+                row = (await session.execute(stmt)).one_or_none()
+                response = row.response if row else None
+                if row:
+                    self._pending_hits[key] += 1
+                    if row.last_used_at <= now - timedelta(seconds=self.touch_interval):
+                        await self._touch(session, key, now)
+        except SQLAlchemyError as e:
+            # A failed write-back still returns the response already read
+            logger.warning(f"LLM cache lookup failed: {e!r}")
+        self.stats[agent]["hits" if response is not None else "misses"] += 1
+        return response
+
+    async def _touch(self, session, key, now):
+        """Write back the hits counted since the entry was last touched."""
+        hits = self._pending_hits.pop(key, 0)
+        await session.execute(
+            sa.update(LLMCacheEntry)
+            .where(LLMCacheEntry.key == key)
+            .values(hits=LLMCacheEntry.hits + hits, last_used_at=now)
+        )
+        await session.commit()
+
+    async def put(self, key, agent, model, response):
+        now = datetime.utcnow()
+        values = {
+            "agent": agent,
+            "model": model,
+            "response": response,
+            "hits": 0,
+            "created_at": now,
+            "last_used_at": now,
+        }
+        try:
+            async for session in get_session(shared=False):
+                stmt = (
+                    pg_insert(LLMCacheEntry)
+                    .values(key=key, **values)
+                    .on_conflict_do_update(index_elements=["key"], set_=values)
+                )
+                await session.execute(stmt)
+                await session.commit()
+        except SQLAlchemyError as e:
+            logger.warning(f"LLM cache store failed: {e!r}")
+            return
+        self._pending_hits.pop(key, None)
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            await self.prune()
+
+    async def prune(self):
+        """Delete expired entries and evict the least recently used overflow."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        try:
+            async for session in get_session(shared=False):
+                await session.execute(
+                    sa.delete(LLMCacheEntry).where(LLMCacheEntry.created_at <= cutoff)
+                )
+                keep = (
+                    sa.select(LLMCacheEntry.id)
+                    .order_by(LLMCacheEntry.last_used_at.desc())
+                    .limit(self.max_entries)
+                )
+                await session.execute(
+                    sa.delete(LLMCacheEntry).where(LLMCacheEntry.id.not_in(keep))
+                )
+                await session.commit()
+        except SQLAlchemyError as e:
+            logger.warning(f"LLM cache prune failed: {e!r}")
+
+    def log_stats(self):
+        for agent, stats in sorted(self.stats.items()):
+            logger.info(
+                f"LLM cache {agent}: hits={stats['hits']} misses={stats['misses']} "
+                f"hit_rate={self.hit_rate(agent):.0%}"
+            )
+
+
+llm_cache = LLMCache()
@@ -1,9 +1,18 @@
 import asyncio
 import click
 import logging
+import os
+from datetime import datetime
 from .agents.orchestrator_agent import OrchestratorAgent
 from .agents.analytics_agent import AnalyticsAgent
 from .agents.crypto_orchestrator import CryptoOrchestrator
+from .agents.crawler_agent import CrawlerAgent
+from .agents.summarizer_agent import SummarizerAgent
+from .agents.factcheck_agent import FactCheckAgent
+from .agents.commentary_agent import CommentaryAgent
+from .config import METRICS_PORT, METRICS_REPORT_DIR, REVIEW_MERGED
+from .db import get_session
+from .metrics import metrics, start_metrics_server
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 logging.basicConfig(
@@ -12,15 +21,96 @@ logging.basicConfig(
 )
 
 
+def _output_path(command, suffix):
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    return os.path.join(METRICS_REPORT_DIR, f"{command}_{stamp}{suffix}")
+
+
+def _start_profiler(ctx, profiler):
+    """Profile the invoked command, saving the result when it exits."""
+    command = ctx.invoked_subcommand or "cli"
+    os.makedirs(METRICS_REPORT_DIR, exist_ok=True)
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise click.UsageError("pyinstrument is not installed (poetry install -E profiling)")
+        prof = Profiler(async_mode="enabled")
+        prof.start()
+
+        def finish():
+            prof.stop()
+            path = _output_path(command, ".html")
+            with open(path, "w") as f:
+                f.write(prof.output_html())
+            logging.getLogger(__name__).info(f"Wrote profile to {path}")
+    else:
+        import cProfile
+
+        prof = cProfile.Profile()
+        prof.enable()
+
+        def finish():
+            prof.disable()
+            path = _output_path(command, ".prof")
+            prof.dump_stats(path)
+            logging.getLogger(__name__).info(f"Wrote profile to {path} (view with snakeviz or pstats)")
+
+    ctx.call_on_close(finish)
+
+
+def _run(coro):
+    """Run ``coro``, serving /metrics while it runs when METRICS_PORT is set."""
+    async def main():
+        runner = await start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+        try:
+            return await coro
+        finally:
+            if runner is not None:
+                await runner.cleanup()
+
+    return asyncio.run(main())
+
+
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--profile",
+    type=click.Choice(["cprofile", "pyinstrument"]),
+    help="Profile the command and save the result to METRICS_REPORT_DIR.",
+)
+@click.option(
+    "--report",
+    is_flag=True,
+    help="Write a JSON report of stage timings, OpenAI usage and DB queries when done.",
+)
+@click.pass_context
+def cli(ctx, profile, report):
+    if report:
+        command = ctx.invoked_subcommand or "cli"
+
+        def write_report():
+            metrics.log_summary()
+            metrics.write_report(_output_path(command, ".json"))
+
+        ctx.call_on_close(write_report)
+    if profile:
+        _start_profiler(ctx, profile)
 
 
 @cli.command()
-def run_daily():
+@click.option(
+    "--pipelined",
+    is_flag=True,
+    help="Stream articles through crawl, summarize, fact-check and commentary concurrently.",
+)
+@click.option(
+    "--merged-review/--separate-review",
+    default=REVIEW_MERGED,
+    help="Fact-check and comment on each summary in one OpenAI request (default: REVIEW_MERGED).",
+)
+def run_daily(pipelined, merged_review):
     orchestrator = OrchestratorAgent()
-    asyncio.run(orchestrator.run_daily())
+    _run(orchestrator.run_daily(pipelined=pipelined, merged=merged_review))
 
 
 @cli.command()
@@ -29,9 +119,14 @@ def run_bot():
     orchestrator.run_bot()
 
 @cli.command()
-def run_stream():
+@click.option(
+    "--daemon",
+    is_flag=True,
+    help="Keep running, polling each feed on its own adaptive schedule.",
+)
+def run_stream(daemon):
     orchestrator = OrchestratorAgent()
-    asyncio.run(orchestrator.run_stream())
+    _run(orchestrator.run_stream(daemon=daemon))
 @cli.command()
 def run_crypto_hourly():
     """Run the crypto news analysis every hour and post to Telegram."""
@@ -39,8 +134,59 @@ def run_crypto_hourly():
     scheduler = AsyncIOScheduler()
     scheduler.add_job(orchestrator.run_once, "interval", hours=1)
     scheduler.start()
+    if METRICS_PORT:
+        asyncio.get_event_loop().run_until_complete(start_metrics_server(METRICS_PORT))
     asyncio.get_event_loop().run_until_complete(orchestrator.run_once())
     asyncio.get_event_loop().run_forever()
+@cli.command()
+@click.argument("kind", type=click.Choice(["summarize", "factcheck", "commentary"]))
+@click.option("--forever", is_flag=True, help="Keep polling for new jobs instead of exiting when idle.")
+def run_worker(kind, forever):
+    """Process KIND jobs from the shared queue; start one per process or host."""
+    agents = {
+        "summarize": SummarizerAgent,
+        "factcheck": FactCheckAgent,
+        "commentary": CommentaryAgent,
+    }
+    agent = agents[kind]()
+
+    async def work():
+        try:
+            await agent.run_queued(forever=forever)
+        finally:
+            await agent.close()
+
+    _run(work())
+
+
+@cli.command()
+def rebuild_seen_urls():
+    """Rebuild the crawler's seen-URL filter from the articles table."""
+    async def rebuild():
+        crawler = CrawlerAgent()
+        async for session in get_session():
+            await crawler.rebuild_seen_filter(session)
+
+    asyncio.run(rebuild())
+
+
+@cli.command()
+def check_query_plans():
+    """Fail if any hot agent query can no longer be served by an index."""
+    from .query_plans import check_query_plans as check
+
+    results = asyncio.run(check())
+    failed = False
+    for name, problems in results.items():
+        if problems:
+            failed = True
+            click.echo(f"FAIL {name}: {'; '.join(problems)}")
+        else:
+            click.echo(f"ok   {name}")
+    if failed:
+        raise SystemExit(1)
+
+
 @cli.command()
 def run_analytics():
     """Generate analytics charts from stored data."""
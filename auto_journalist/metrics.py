@@ -0,0 +1,204 @@
+import json
+import logging
+import math
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from aiohttp import web
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "auto_journalist_"
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{str(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of ``samples`` (``q`` between 0 and 1)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class Metrics:
+    """
+    Process-wide counters and timers, labelled by stage, agent, etc.
+
+    Timers keep the last ``max_samples`` observations per label set for the
+    p50/p95 summaries, plus an exact count and sum.
+    """
+
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.started_at = datetime.utcnow()
+        self.counters = defaultdict(float)
+        self.samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self.totals = defaultdict(lambda: [0, 0.0])
+
+    def inc(self, name, value=1, **labels):
+        self.counters[(name, _labels_key(labels))] += value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels_key(labels))
+        self.samples[key].append(seconds)
+        total = self.totals[key]
+        total[0] += 1
+        total[1] += seconds
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        self.started_at = datetime.utcnow()
+        self.counters.clear()
+        self.samples.clear()
+        self.totals.clear()
+
+    def report(self):
+        """JSON-serializable snapshot of every counter and timer."""
+        return {
+            "started_at": self.started_at.isoformat(),
+            "generated_at": datetime.utcnow().isoformat(),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            "timers": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": self.totals[(name, labels)][0],
+                    "sum": self.totals[(name, labels)][1],
+                    "p50": percentile(samples, 0.5),
+                    "p95": percentile(samples, 0.95),
+                }
+                for (name, labels), samples in sorted(self.samples.items())
+            ],
+        }
+
+    def write_report(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        logger.info(f"Wrote run report to {path}")
+
+    def prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        seen = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                seen.add(name)
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for (name, labels), samples in sorted(self.samples.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {PREFIX}{name} summary")
+                seen.add(name)
+            for q in (0.5, 0.95):
+                lines.append(
+                    f"{PREFIX}{name}{_format_labels(labels, [('quantile', q)])} "
+                    f"{percentile(samples, q)}"
+                )
+            count, total = self.totals[(name, labels)]
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {total}")
+        return "\n".join(lines) + "\n"
+
+    def log_summary(self):
+        for (name, labels), samples in sorted(self.samples.items()):
+            count, total = self.totals[(name, labels)]
+            logger.info(
+                f"{name}{_format_labels(labels)}: n={count} total={total:.2f}s "
+                f"p50={percentile(samples, 0.5):.3f}s p95={percentile(samples, 0.95):.3f}s"
+            )
+
+
+metrics = Metrics()
+
+
+def instrument_engine(engine):
+    """Count and time every DB round-trip made through ``engine``."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append((context, time.perf_counter()))
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _, start = conn.info["query_start"].pop()
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        metrics.inc("db_queries_total", verb=verb)
+        metrics.observe("db_query_seconds", time.perf_counter() - start)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        # after_cursor_execute never fires for a failed statement, so drop
+        # its start time here; errors raised before the cursor ran have none.
+        conn = exception_context.connection
+        starts = conn.info.get("query_start") if conn is not None else None
+        if starts and starts[-1][0] is exception_context.execution_context:
+            starts.pop()
+
+
+def instrument_pool(engine):
+    """Count pool connects, checkouts and invalidations, and time how long connections are held."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        metrics.inc("db_pool_connects_total")
+
+    @event.listens_for(sync_engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.inc("db_pool_checkouts_total")
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        start = connection_record.info.pop("checked_out_at", None)
+        if start is not None:
+            metrics.observe("db_connection_held_seconds", time.perf_counter() - start)
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _invalidate(dbapi_connection, connection_record, exception):
+        metrics.inc("db_pool_invalidations_total")
+
+
+async def start_metrics_server(port, host="0.0.0.0"):
+    """Serve ``/metrics`` (Prometheus) and ``/report`` (JSON); returns the runner."""
+    async def prometheus(request):
+        return web.Response(text=metrics.prometheus(), content_type="text/plain")
+
+    async def report(request):
+        return web.json_response(metrics.report())
+
+    app = web.Application()
+    app.router.add_get("/metrics", prometheus)
+    app.router.add_get("/report", report)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,86 @@
+import hashlib
+import random
+import re
+from collections import defaultdict
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\w+")
+
+
+def shingles(text, size=3):
+    """Return the set of lower-cased word ``size``-grams in ``text``."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures whose agreement estimates Jaccard similarity."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._perms = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text):
+        """Signature of ``text``'s shingles, or None if it has no words."""
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+            for s in shingles(text)
+        ]
+        if not hashes:
+            return None
+        return tuple(
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+
+def similarity(sig_a, sig_b):
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class LSHIndex:
+    """
+    Banded locality-sensitive hashing over MinHash signatures.
+
+    Signatures are split into ``bands`` bands; two items become candidates
+    when any band matches exactly. Candidates should be confirmed with
+    ``similarity``.
+    """
+
+    def __init__(self, num_perm=64, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.rows = num_perm // bands
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+        self.signatures = {}
+
+    def _bands(self, sig):
+        for i, buckets in enumerate(self._buckets):
+            yield buckets, sig[i * self.rows:(i + 1) * self.rows]
+
+    def add(self, key, sig):
+        self.signatures[key] = sig
+        for buckets, band in self._bands(sig):
+            buckets[band].append(key)
+
+    def query(self, sig):
+        candidates = set()
+        for buckets, band in self._bands(sig):
+            candidates.update(buckets.get(band, ()))
+        return candidates
+
+    def best_match(self, sig, threshold):
+        """Return ``(key, score)`` of the most similar indexed item above ``threshold``."""
+        best_key, best_score = None, threshold
+        for key in self.query(sig):
+            score = similarity(sig, self.signatures[key])
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key, best_score
@@ -8,6 +8,7 @@ from sqlalchemy import (
     String,
     DateTime,
     Boolean,
+    Float,
     Text,
     ForeignKey,
     Enum as SAEnum,
@@ -35,6 +36,19 @@ class FactStatusEnum(enum.Enum):
     NOT_VERIFIABLE = "not_verifiable"
 
 
+class JobStatusEnum(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+
+
+class OutboxStatusEnum(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -62,6 +76,10 @@ class Preference(Base):
 
     user = relationship("User", back_populates="preferences")
 
+    __table_args__ = (
+        sa.Index("ix_preferences_frequency_last_sent", "frequency", "last_sent"),
+    )
+
 
 class Source(Base):
     __tablename__ = "sources"
@@ -77,6 +95,27 @@ class Source(Base):
     )
 
 
+class FeedCache(Base):
+    """
+    HTTP validators from the last successful download of a feed, and the
+    adaptive polling schedule used by the stream daemon.
+    """
+
+    __tablename__ = "feed_cache"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False, unique=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_length = Column(Integer, nullable=False, default=0)
+    checked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    poll_interval = Column(Float, nullable=True)
+    next_poll_at = Column(DateTime, nullable=True)
+    last_new_at = Column(DateTime, nullable=True)
+    # Moving average of the seconds between new entries
+    mean_gap = Column(Float, nullable=True)
+
+
 class UserSource(Base):
     __tablename__ = "user_sources"
 
@@ -100,10 +139,42 @@ class Article(Base):
     source = Column(String, nullable=False)
     raw_json = Column(JSONB, nullable=False)
     fetched_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    cluster_id = Column(
+        Integer,
+        ForeignKey("story_clusters.id", use_alter=True, name="fk_articles_cluster_id"),
+        nullable=True,
+        index=True,
+    )
 
     summary = relationship(
         "Summary", back_populates="article", uselist=False, cascade="all, delete-orphan"
     )
+    cluster = relationship(
+        "StoryCluster", back_populates="articles", foreign_keys=[cluster_id]
+    )
+
+    __table_args__ = (
+        sa.Index("ix_articles_source_fetched_at", "source", "fetched_at"),
+    )
+
+
+class StoryCluster(Base):
+    """Near-duplicate articles covering the same story, summarized once."""
+
+    __tablename__ = "story_clusters"
+
+    id = Column(Integer, primary_key=True)
+    representative_article_id = Column(
+        Integer, ForeignKey("articles.id"), nullable=False, unique=True
+    )
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    representative = relationship(
+        "Article", foreign_keys=[representative_article_id]
+    )
+    articles = relationship(
+        "Article", back_populates="cluster", foreign_keys="Article.cluster_id"
+    )
 
 
 class Summary(Base):
@@ -115,9 +186,12 @@ class Summary(Base):
     author = Column(String, nullable=True)
     publish_date = Column(DateTime, nullable=True)
     topic = Column(String, nullable=True)
+    cluster_id = Column(Integer, ForeignKey("story_clusters.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     article = relationship("Article", back_populates="summary")
+    # The cluster's articles are every source covering this summary's story
+    cluster = relationship("StoryCluster")
     factcheck = relationship(
         "FactCheck",
         back_populates="summary",
@@ -130,6 +204,36 @@ class Summary(Base):
         uselist=False,
         cascade="all, delete-orphan",
     )
+    topics = relationship("Topic", secondary="summary_topics", viewonly=True)
+
+    __table_args__ = (
+        sa.Index("ix_summaries_created_at", "created_at"),
+    )
+
+
+class Topic(Base):
+    """Normalized topic tag (see ``topics.normalize_topic``)."""
+
+    __tablename__ = "topics"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+
+class SummaryTopic(Base):
+    __tablename__ = "summary_topics"
+
+    summary_id = Column(
+        Integer, ForeignKey("summaries.id", ondelete="CASCADE"), primary_key=True
+    )
+    topic_id = Column(
+        Integer, ForeignKey("topics.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    __table_args__ = (
+        # Topic -> summaries lookups for PublisherAgent
+        sa.Index("ix_summary_topics_topic_id_summary_id", "topic_id", "summary_id"),
+    )
 
 
 class FactCheck(Base):
@@ -145,6 +249,10 @@ class FactCheck(Base):
 
     summary = relationship("Summary", back_populates="factcheck")
 
+    __table_args__ = (
+        sa.Index("ix_factchecks_status_summary_id", "status", "summary_id"),
+    )
+
 
 class Commentary(Base):
     __tablename__ = "commentaries"
@@ -167,6 +275,21 @@ class Issue(Base):
     filename_html = Column(String, nullable=False)
     filename_txt = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    item_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
+
+
+class IssueItem(Base):
+    """A commentary already written to an issue's files; later ones are appended."""
+
+    __tablename__ = "issue_items"
+
+    issue_id = Column(
+        Integer, ForeignKey("issues.id", ondelete="CASCADE"), primary_key=True
+    )
+    commentary_id = Column(
+        Integer, ForeignKey("commentaries.id", ondelete="CASCADE"), primary_key=True
+    )
 
 
 class StreamItem(Base):
@@ -176,6 +299,82 @@ class StreamItem(Base):
     summary_id = Column(
         Integer, ForeignKey("summaries.id"), nullable=False, unique=True
     )
-    sent_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    queued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # When Telegram accepted the post, copied from its outbox message
+    sent_at = Column(DateTime, nullable=True)
+    outbox_id = Column(
+        Integer, ForeignKey("outbox.id", ondelete="SET NULL"), nullable=True
+    )
 
     summary = relationship("Summary")
+    outbox = relationship("OutboxMessage")
+
+
+
+class LLMCacheEntry(Base):
+    """Cached OpenAI response, keyed by a hash of the request parameters."""
+
+    __tablename__ = "llm_cache"
+
+    id = Column(Integer, primary_key=True)
+    key = Column(String(64), nullable=False, unique=True)
+    agent = Column(String, nullable=False)
+    model = Column(String, nullable=True)
+    response = Column(JSONB, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_used_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class Job(Base):
+    """Unit of agent work claimed by workers with SELECT ... FOR UPDATE SKIP LOCKED."""
+
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    item_id = Column(Integer, nullable=False)
+    status = Column(
+        SAEnum(JobStatusEnum, name="jobstatus"),
+        nullable=False,
+        default=JobStatusEnum.PENDING,
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    # Lease expiry while running; earliest retry time while pending
+    lease_until = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        sa.UniqueConstraint("kind", "item_id", name="uix_job_kind_item"),
+        sa.Index("ix_jobs_kind_status", "kind", "status", "lease_until"),
+    )
+
+
+class OutboxMessage(Base):
+    """Telegram message awaiting delivery; survives restarts until sent."""
+
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(String, nullable=False)
+    text = Column(Text, nullable=False)
+    photo_url = Column(String, nullable=True)
+    parse_mode = Column(String, nullable=True)
+    status = Column(
+        SAEnum(OutboxStatusEnum, name="outboxstatus"),
+        nullable=False,
+        default=OutboxStatusEnum.PENDING,
+    )
+    attempts = Column(Integer, nullable=False, default=0)
+    # Earliest time the message may be (re)claimed by a sender
+    not_before = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        sa.Index("ix_outbox_status_not_before", "status", "not_before"),
+    )
@@ -0,0 +1,149 @@
+import html
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+
+try:  # optional dependency: exact token counts for OpenAI models
+    import tiktoken
+except ImportError:  # pragma: no cover - depends on installed extras
+    tiktoken = None
+
+# Rough characters-per-token ratio used when tiktoken is not installed
+_CHARS_PER_TOKEN = 4
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class _TextExtractor(HTMLParser):
+    _SKIP = {"script", "style", "noscript"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skipping += 1
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP and self._skipping:
+            self._skipping -= 1
+
+    def handle_data(self, data):
+        if not self._skipping:
+            self.parts.append(data)
+
+
+def strip_html(text):
+    """Return the visible text of an HTML fragment with whitespace collapsed."""
+    if not text:
+        return ""
+    if "<" not in text:
+        return _WHITESPACE.sub(" ", html.unescape(text)).strip()
+    parser = _TextExtractor()
+    parser.feed(text)
+    parser.close()
+    return _WHITESPACE.sub(" ", " ".join(parser.parts)).strip()
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model="gpt-4o"):
+    if tiktoken is None:
+        return -(-len(text) // _CHARS_PER_TOKEN)
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-4o"):
+    """Cut ``text`` down to at most ``max_tokens`` tokens."""
+    if tiktoken is None:
+        return text[: max_tokens * _CHARS_PER_TOKEN]
+    encoding = _encoding(model)
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def _entry_body(raw_json):
+    # Prefer the longest full-content block, falling back to the summary
+    bodies = [
+        block.get("value", "")
+        for block in raw_json.get("content") or []
+        if isinstance(block, dict)
+    ]
+    bodies.append(raw_json.get("summary") or raw_json.get("description") or "")
+    return strip_html(max(bodies, key=len))
+
+
+def entry_text(raw_json):
+    """Plain title and body text of a feed entry, e.g. for similarity checks."""
+    if not isinstance(raw_json, dict):
+        return strip_html(str(raw_json))
+    return f"{strip_html(raw_json.get('title', ''))} {_entry_body(raw_json)}".strip()
+
+
+def compact_article(raw_json, source=None, max_tokens=1500, model="gpt-4o"):
+    """
+    Build the prompt text for an article from its raw feed entry.
+
+    Only the title, author, publish date, source and a cleaned, truncated
+    body are kept. Returns ``(text, raw_tokens, compact_tokens)`` so callers
+    can report the savings.
+    """
+    raw_tokens = count_tokens(str(raw_json), model)
+    if not isinstance(raw_json, dict):
+        text = truncate_to_tokens(strip_html(str(raw_json)), max_tokens, model)
+        return text, raw_tokens, count_tokens(text, model)
+
+    lines = []
+    for label, value in (
+        ("Title", strip_html(raw_json.get("title", ""))),
+        ("Author", raw_json.get("author")),
+        ("Published", raw_json.get("published") or raw_json.get("updated")),
+        ("Source", source),
+    ):
+        if value:
+            lines.append(f"{label}: {value}")
+    header = "\n".join(lines)
+
+    budget = max_tokens - count_tokens(header, model) - 1
+    body = _entry_body(raw_json)
+    if body and budget > 0:
+        text = f"{header}\n\n{truncate_to_tokens(body, budget, model)}"
+    else:
+        text = header
+    return text, raw_tokens, count_tokens(text, model)
+
+
+def strip_code_fence(payload):
+    """Remove a Markdown code fence wrapped around a JSON reply."""
+    payload = payload.strip()
+    if payload.startswith("```"):
+        payload = payload.split("\n", 1)[1] if "\n" in payload else ""
+        payload = payload.rsplit("```", 1)[0]
+    return payload.strip()
+
+
+def summary_payload(summary):
+    """
+    Prompt text for a stored summary: its structured topic, author and
+    publish date as header lines, followed by the summary bullets.
+    """
+    lines = []
+    for label, value in (
+        ("Topic", summary.topic),
+        ("Author", summary.author),
+        ("Published", summary.publish_date.date().isoformat() if summary.publish_date else None),
+    ):
+        if value:
+            lines.append(f"{label}: {value}")
+    lines.append(summary.summary_text)
+    return "\n".join(lines)
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input; each worker re-queues it for its siblings
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a pipeline.
+
+    ``workers`` coroutines take items from a bounded input queue of
+    ``queue_size`` and pass them to ``handler``, which returns an iterable
+    of items for the next stage (or None). A full queue blocks the stage
+    feeding it, so slow stages apply backpressure upstream. With
+    ``batch_size`` > 1 the handler receives lists of up to that many items,
+    waiting at most ``batch_wait`` seconds to fill a batch; ``batched``
+    forces list input even for a batch size of 1. ``seed`` items
+    (e.g. a backlog left by earlier runs) are queued when the pipeline starts.
+    """
+
+    def __init__(self, name, handler, workers=1, queue_size=100, batch_size=1,
+                 batch_wait=0.5, batched=None, seed=()):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.batched = batch_size > 1 if batched is None else batched
+        self.seed = list(seed)
+        self.processed = 0
+        self.failed = 0
+
+
+async def _take(queue, size, wait):
+    """Return ``(items, done)`` with up to ``size`` items from ``queue``."""
+    item = await queue.get()
+    if item is _DONE:
+        queue.put_nowait(_DONE)
+        return [], True
+    items = [item]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while len(items) < size:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            break
+        if item is _DONE:
+            queue.put_nowait(_DONE)
+            return items, True
+        items.append(item)
+    return items, False
+
+
+async def _work(stage, inbox, outbox):
+    while True:
+        items, done = await _take(inbox, stage.batch_size, stage.batch_wait)
+        if items:
+            try:
+                with metrics.timer("pipeline_handler_seconds", stage=stage.name):
+                    if stage.batched:
+                        results = await stage.handler(items)
+                    else:
+                        results = await stage.handler(items[0])
+                stage.processed += len(items)
+                metrics.inc("pipeline_items_total", len(items), stage=stage.name, outcome="ok")
+            except Exception:
+                stage.failed += len(items)
+                metrics.inc("pipeline_items_total", len(items), stage=stage.name, outcome="failed")
+                logger.exception(f"Pipeline stage {stage.name} failed on {items!r}")
+                results = None
+            if results and outbox is not None:
+                for result in results:
+                    await outbox.put(result)
+        if done:
+            return
+
+
+async def _run_stage(stage, inbox, outbox, upstream):
+    async def feed_seed():
+        for item in stage.seed:
+            await inbox.put(item)
+
+    workers = [
+        asyncio.create_task(_work(stage, inbox, outbox))
+        for _ in range(stage.workers)
+    ]
+    seed = asyncio.create_task(feed_seed())
+    try:
+        await asyncio.gather(upstream, seed)
+        await inbox.put(_DONE)
+        await asyncio.gather(*workers)
+    finally:
+        # If upstream failed or we were cancelled, _DONE never arrives;
+        # don't leave the workers blocked on the queue
+        for task in (seed, *workers):
+            task.cancel()
+        await asyncio.gather(seed, *workers, return_exceptions=True)
+
+
+async def run_pipeline(source, stages):
+    """
+    Stream items from ``source`` through ``stages``.
+
+    ``source`` is an async iterable yielding lists of items for the first
+    stage. Each stage finishes once its upstream is exhausted and its queue
+    is drained, so the call returns when every item has flowed through.
+    If the source or a stage raises, every stage is cancelled and the
+    exception propagates; items still queued are dropped.
+    """
+    queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in stages]
+
+    async def feed_source():
+        try:
+            async for items in source:
+                for item in items:
+                    await queues[0].put(item)
+        finally:
+            # Let the source clean up (e.g. cancel its fetches) when stopped early
+            if hasattr(source, "aclose"):
+                await source.aclose()
+
+    tasks = [asyncio.create_task(feed_source())]
+    for i, stage in enumerate(stages):
+        outbox = queues[i + 1] if i + 1 < len(queues) else None
+        tasks.append(asyncio.create_task(_run_stage(stage, queues[i], outbox, tasks[-1])))
+    try:
+        await tasks[-1]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    for stage in stages:
+        logger.info(
+            f"Pipeline stage {stage.name}: processed={stage.processed} failed={stage.failed}"
+        )
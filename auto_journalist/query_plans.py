@@ -0,0 +1,106 @@
+import json
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from .config import CRYPTO_SOURCES
+from .db import get_session
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def hot_queries():
+    """
+    ``(name, statement, expected_index)`` for the agent queries that must
+    stay index-backed. ``expected_index`` may be None when any index will do.
+    """
+    from .agents.analytics_agent import AnalyticsAgent
+    from .agents.crypto_agent import CryptoTrendAgent
+    from .agents.formatter_agent import FormatterAgent
+    from .agents.publisher_agent import PublisherAgent
+
+    return [
+        (
+            "FormatterAgent.issue_items",
+            FormatterAgent.issue_items(datetime.utcnow().date()),
+            "ix_summaries_created_at",
+        ),
+        (
+            "PublisherAgent.top_summaries",
+            PublisherAgent.top_summaries(["technology", "politics"]),
+            "ix_summary_topics_topic_id_summary_id",
+        ),
+        (
+            "PublisherAgent.candidate_summaries",
+            PublisherAgent.candidate_summaries(datetime.utcnow() - timedelta(days=7)),
+            "ix_summaries_created_at",
+        ),
+        (
+            "PublisherAgent.due_preferences",
+            PublisherAgent.due_preferences(datetime.utcnow()),
+            "ix_preferences_frequency_last_sent",
+        ),
+        (
+            "CryptoTrendAgent.recent_summaries",
+            CryptoTrendAgent.recent_summaries([s["name"] for s in CRYPTO_SOURCES]),
+            None,
+        ),
+        (
+            "AnalyticsAgent.article_counts",
+            AnalyticsAgent.article_counts(),
+            "ix_articles_source_fetched_at",
+        ),
+    ]
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def check_plan(plan, expected_index=None):
+    """Return a list of problems found in an EXPLAIN (FORMAT JSON) plan."""
+    nodes = list(_plan_nodes(plan))
+    problems = [
+        f"sequential scan on {node['Relation Name']}"
+        for node in nodes
+        if node["Node Type"] == "Seq Scan"
+    ]
+    used = {node["Index Name"] for node in nodes if "Index Name" in node}
+    if expected_index and expected_index not in used:
+        problems.append(
+            f"expected {expected_index}, used {', '.join(sorted(used)) or 'no index'}"
+        )
+    return problems
+
+
+async def check_query_plans():
+    """
+    EXPLAIN every hot query with sequential scans disabled and return
+    ``{name: problems}``. Seq scans are only chosen then when no index can
+    serve the query, so a plan that still contains one means a query
+    rewrite or a missing migration made the access path unindexable.
+    """
+    results = {}
+    async for session in get_session():
+        await session.execute(sa.text("SET LOCAL enable_seqscan = off"))
+        for name, stmt, expected_index in hot_queries():
+            output = (await session.execute(_Explain(stmt))).scalar_one()
+            if isinstance(output, str):
+                output = json.loads(output)
+            results[name] = check_plan(output[0]["Plan"], expected_index)
+        await session.rollback()
+    return results
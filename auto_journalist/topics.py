@@ -0,0 +1,103 @@
+import re
+from collections import Counter
+
+# Fallback tag so every classified summary has at least one topic
+GENERAL_TOPIC = "general"
+
+# Keywords per topic; a summary needs MIN_KEYWORD_HITS of them to get the tag
+TOPIC_KEYWORDS = {
+    "technology": [
+        "technology", "tech", "software", "ai", "artificial intelligence", "chip",
+        "semiconductor", "startup", "app", "internet", "cyber", "robot", "computer",
+        "smartphone", "cloud", "data",
+    ],
+    "politics": [
+        "politics", "election", "government", "parliament", "congress", "senate",
+        "president", "minister", "policy", "vote", "campaign", "law", "court",
+        "regulation",
+    ],
+    "business": [
+        "business", "market", "company", "economy", "economic", "stock", "shares",
+        "investor", "profit", "revenue", "trade", "inflation", "bank", "merger",
+    ],
+    "science": [
+        "science", "research", "scientists", "study", "space", "nasa", "satellite",
+        "physics", "biology", "discovery",
+    ],
+    "health": [
+        "health", "hospital", "vaccine", "disease", "virus", "medical", "patients",
+        "drug", "doctors", "pandemic",
+    ],
+    "climate": [
+        "climate", "emissions", "carbon", "renewable", "energy", "warming",
+        "environment", "pollution", "weather",
+    ],
+    "sports": [
+        "sports", "sport", "football", "soccer", "league", "match", "championship",
+        "olympics", "tennis", "basketball", "cup",
+    ],
+    "crypto": [
+        "crypto", "cryptocurrency", "bitcoin", "ethereum", "blockchain", "token",
+        "stablecoin", "defi",
+    ],
+    "entertainment": [
+        "film", "movie", "music", "celebrity", "television", "streaming", "album",
+        "festival",
+    ],
+}
+MIN_KEYWORD_HITS = 2
+MAX_TOPICS = 5
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+# "Topic: AI", "Topic tag - Politics", "Topics: tech, markets"
+_EXPLICIT_TAG = re.compile(r"topic(?:\s+tag)?s?\s*[:\-]\s*([^\n]+)", re.IGNORECASE)
+_HASHTAG = re.compile(r"#(\w[\w-]*)")
+
+
+def normalize_topic(topic):
+    """Canonical form of a topic tag: lower-case words separated by single spaces."""
+    return _NON_WORD.sub(" ", (topic or "").lower()).strip()
+
+
+def _explicit_tags(text):
+    parts = [
+        part
+        for match in _EXPLICIT_TAG.finditer(text)
+        for part in re.split(r"[,;/|]", match.group(1))
+    ]
+    parts.extend(_HASHTAG.findall(text))
+    # Hashtags like "#_" normalize to nothing
+    return [tag for tag in map(normalize_topic, parts) if tag and len(tag) <= 40]
+
+
+class TopicClassifier:
+    """
+    Assigns normalized topic tags to summary text without an LLM call.
+
+    Tags come from explicit ``Topic:`` lines and hashtags in the text, from
+    the keyword lists in ``keywords``, and from ``vocabulary`` (e.g. the
+    topics users subscribed to) when the phrase occurs in the text.
+    """
+
+    def __init__(self, keywords=TOPIC_KEYWORDS, vocabulary=(), max_topics=MAX_TOPICS):
+        self.keywords = {
+            topic: [normalize_topic(k) for k in words] for topic, words in keywords.items()
+        }
+        self.vocabulary = {normalize_topic(v) for v in vocabulary} - {""}
+        self.max_topics = max_topics
+
+    def classify(self, text):
+        """Return up to ``max_topics`` tags, most specific first."""
+        normalized = f" {normalize_topic(text)} "
+        tags = list(dict.fromkeys(_explicit_tags(text)))
+
+        hits = Counter()
+        for topic, words in self.keywords.items():
+            for word in words:
+                if f" {word} " in normalized:
+                    hits[topic] += normalized.count(f" {word} ")
+        tags.extend(topic for topic, n in hits.most_common() if n >= MIN_KEYWORD_HITS)
+        tags.extend(sorted(v for v in self.vocabulary if f" {v} " in normalized))
+
+        tags = list(dict.fromkeys(tags))[:self.max_topics]
+        return tags or [GENERAL_TOPIC]
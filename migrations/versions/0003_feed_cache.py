@@ -0,0 +1,24 @@
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+revision = '0003_feed_cache'
+down_revision = '0002_stream_items'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'feed_cache',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('url', sa.String(), nullable=False, unique=True),
+        sa.Column('etag', sa.String(), nullable=True),
+        sa.Column('last_modified', sa.String(), nullable=True),
+        sa.Column('content_length', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('checked_at', sa.DateTime(), nullable=False, default=datetime.utcnow),
+    )
+
+
+def downgrade():
+    op.drop_table('feed_cache')
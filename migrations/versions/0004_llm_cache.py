@@ -0,0 +1,29 @@
+from alembic import op
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql as pg
+from datetime import datetime
+
+revision = '0004_llm_cache'
+down_revision = '0003_feed_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'llm_cache',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('key', sa.String(64), nullable=False, unique=True),
+        sa.Column('agent', sa.String(), nullable=False),
+        sa.Column('model', sa.String(), nullable=True),
+        sa.Column('response', pg.JSONB(), nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, default=datetime.utcnow),
+        sa.Column('last_used_at', sa.DateTime(), nullable=False, default=datetime.utcnow),
+    )
+    op.create_index('ix_llm_cache_last_used_at', 'llm_cache', ['last_used_at'])
+
+
+def downgrade():
+    op.drop_index('ix_llm_cache_last_used_at', table_name='llm_cache')
+    op.drop_table('llm_cache')
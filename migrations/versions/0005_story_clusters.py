@@ -0,0 +1,33 @@
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+
+revision = '0005_story_clusters'
+down_revision = '0004_llm_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'story_clusters',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('representative_article_id', sa.Integer(), sa.ForeignKey('articles.id'), nullable=False, unique=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, default=datetime.utcnow),
+    )
+    op.add_column(
+        'articles',
+        sa.Column('cluster_id', sa.Integer(), sa.ForeignKey('story_clusters.id', name='fk_articles_cluster_id'), nullable=True),
+    )
+    op.create_index('ix_articles_cluster_id', 'articles', ['cluster_id'])
+    op.add_column(
+        'summaries',
+        sa.Column('cluster_id', sa.Integer(), sa.ForeignKey('story_clusters.id', name='fk_summaries_cluster_id'), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column('summaries', 'cluster_id')
+    op.drop_index('ix_articles_cluster_id', table_name='articles')
+    op.drop_column('articles', 'cluster_id')
+    op.drop_table('story_clusters')
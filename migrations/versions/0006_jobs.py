@@ -0,0 +1,40 @@
+from alembic import op
+import sqlalchemy as sa
+import enum
+from datetime import datetime
+
+revision = '0006_jobs'
+down_revision = '0005_story_clusters'
+branch_labels = None
+depends_on = None
+
+
+class JobStatusEnum(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    DEAD = "dead"
+
+
+def upgrade():
+    op.create_table(
+        'jobs',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('kind', sa.String(), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.Enum(JobStatusEnum, name='jobstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='3'),
+        sa.Column('lease_until', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, default=datetime.utcnow),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, default=datetime.utcnow),
+        sa.UniqueConstraint('kind', 'item_id', name='uix_job_kind_item'),
+    )
+    op.create_index('ix_jobs_kind_status', 'jobs', ['kind', 'status', 'lease_until'])
+
+
+def downgrade():
+    op.drop_index('ix_jobs_kind_status', table_name='jobs')
+    op.drop_table('jobs')
+    op.execute("DROP TYPE IF EXISTS jobstatus;")
@@ -0,0 +1,29 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0007_query_indexes'
+down_revision = '0006_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FormatterAgent / NewsStreamAgent / CryptoTrendAgent: range filters and
+    # ordering on summaries.created_at
+    op.create_index('ix_summaries_created_at', 'summaries', ['created_at'])
+    # PublisherAgent: lower(topic) = lower(:topic)
+    op.create_index('ix_summaries_lower_topic', 'summaries', [sa.text('lower(topic)')])
+    # PublisherAgent: verified fact checks joined back to their summaries
+    op.create_index('ix_factchecks_status_summary_id', 'factchecks', ['status', 'summary_id'])
+    # CryptoTrendAgent: source IN (...); AnalyticsAgent: GROUP BY source
+    op.create_index('ix_articles_source_fetched_at', 'articles', ['source', 'fetched_at'])
+    # PublisherAgent: preferences due for delivery
+    op.create_index('ix_preferences_frequency_last_sent', 'preferences', ['frequency', 'last_sent'])
+
+
+def downgrade():
+    op.drop_index('ix_preferences_frequency_last_sent', table_name='preferences')
+    op.drop_index('ix_articles_source_fetched_at', table_name='articles')
+    op.drop_index('ix_factchecks_status_summary_id', table_name='factchecks')
+    op.drop_index('ix_summaries_lower_topic', table_name='summaries')
+    op.drop_index('ix_summaries_created_at', table_name='summaries')
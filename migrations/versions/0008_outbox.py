@@ -0,0 +1,39 @@
+from alembic import op
+import sqlalchemy as sa
+import enum
+from datetime import datetime
+
+revision = '0008_outbox'
+down_revision = '0007_query_indexes'
+branch_labels = None
+depends_on = None
+
+
+class OutboxStatusEnum(enum.Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+def upgrade():
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('chat_id', sa.String(), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('photo_url', sa.String(), nullable=True),
+        sa.Column('parse_mode', sa.String(), nullable=True),
+        sa.Column('status', sa.Enum(OutboxStatusEnum, name='outboxstatus'), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('not_before', sa.DateTime(), nullable=False, default=datetime.utcnow),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, default=datetime.utcnow),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_outbox_status_not_before', 'outbox', ['status', 'not_before'])
+
+
+def downgrade():
+    op.drop_index('ix_outbox_status_not_before', table_name='outbox')
+    op.drop_table('outbox')
+    op.execute("DROP TYPE IF EXISTS outboxstatus;")
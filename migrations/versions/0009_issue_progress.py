@@ -0,0 +1,19 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0009_issue_progress'
+down_revision = '0008_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('issues', sa.Column('last_commentary_id', sa.Integer(), nullable=True))
+    op.add_column('issues', sa.Column('item_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('issues', sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('issues', 'updated_at')
+    op.drop_column('issues', 'item_count')
+    op.drop_column('issues', 'last_commentary_id')
@@ -0,0 +1,21 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0010_feed_schedule'
+down_revision = '0009_issue_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('feed_cache', sa.Column('poll_interval', sa.Float(), nullable=True))
+    op.add_column('feed_cache', sa.Column('next_poll_at', sa.DateTime(), nullable=True))
+    op.add_column('feed_cache', sa.Column('last_new_at', sa.DateTime(), nullable=True))
+    op.add_column('feed_cache', sa.Column('mean_gap', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feed_cache', 'mean_gap')
+    op.drop_column('feed_cache', 'last_new_at')
+    op.drop_column('feed_cache', 'next_poll_at')
+    op.drop_column('feed_cache', 'poll_interval')
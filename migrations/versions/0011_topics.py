@@ -0,0 +1,29 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0011_topics'
+down_revision = '0010_feed_schedule'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'topics',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(), nullable=False, unique=True),
+    )
+    op.create_table(
+        'summary_topics',
+        sa.Column('summary_id', sa.Integer(), sa.ForeignKey('summaries.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('topic_id', sa.Integer(), sa.ForeignKey('topics.id', ondelete='CASCADE'), primary_key=True),
+    )
+    op.create_index(
+        'ix_summary_topics_topic_id_summary_id', 'summary_topics', ['topic_id', 'summary_id']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_summary_topics_topic_id_summary_id', table_name='summary_topics')
+    op.drop_table('summary_topics')
+    op.drop_table('topics')
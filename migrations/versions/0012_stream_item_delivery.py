@@ -0,0 +1,26 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0012_stream_item_delivery'
+down_revision = '0011_topics'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows only know when they were queued
+    op.add_column('stream_items', sa.Column('queued_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE stream_items SET queued_at = sent_at')
+    op.alter_column('stream_items', 'queued_at', nullable=False)
+    op.alter_column('stream_items', 'sent_at', nullable=True)
+    op.add_column(
+        'stream_items',
+        sa.Column('outbox_id', sa.Integer(), sa.ForeignKey('outbox.id', ondelete='SET NULL'), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_column('stream_items', 'outbox_id')
+    op.execute('UPDATE stream_items SET sent_at = queued_at WHERE sent_at IS NULL')
+    op.alter_column('stream_items', 'sent_at', nullable=False)
+    op.drop_column('stream_items', 'queued_at')
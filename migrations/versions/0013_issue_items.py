@@ -0,0 +1,41 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0013_issue_items'
+down_revision = '0012_stream_item_delivery'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'issue_items',
+        sa.Column('issue_id', sa.Integer(), sa.ForeignKey('issues.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('commentary_id', sa.Integer(), sa.ForeignKey('commentaries.id', ondelete='CASCADE'), primary_key=True),
+    )
+    # Everything up to the old watermark is already in the issue's files
+    op.execute(
+        """
+        INSERT INTO issue_items (issue_id, commentary_id)
+        SELECT issues.id, commentaries.id
+        FROM issues
+        JOIN summaries ON summaries.created_at >= issues.date
+            AND summaries.created_at < issues.date + interval '1 day'
+        JOIN factchecks ON factchecks.summary_id = summaries.id
+        JOIN commentaries ON commentaries.summary_id = summaries.id
+        WHERE commentaries.id <= issues.last_commentary_id
+        """
+    )
+    op.drop_column('issues', 'last_commentary_id')
+
+
+def downgrade():
+    op.add_column('issues', sa.Column('last_commentary_id', sa.Integer(), nullable=True))
+    op.execute(
+        """
+        UPDATE issues SET last_commentary_id = (
+            SELECT max(commentary_id) FROM issue_items WHERE issue_items.issue_id = issues.id
+        )
+        """
+    )
+    op.drop_table('issue_items')
@@ -0,0 +1,16 @@
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0014_drop_lower_topic_index'
+down_revision = '0013_issue_items'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PublisherAgent matches topics through summary_topics since 0011
+    op.drop_index('ix_summaries_lower_topic', table_name='summaries')
+
+
+def downgrade():
+    op.create_index('ix_summaries_lower_topic', 'summaries', [sa.text('lower(topic)')])